@@ -7,6 +7,13 @@ Usage:
 """
 
 import asyncio
+
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass  # uvloop is optional (Linux/macOS only)
+
 from src.bot import main
 
 if __name__ == "__main__":
@@ -4,26 +4,48 @@ Anytype API Client for creating objects and managing references.
 Based on Anytype API documentation: https://developers.anytype.io/docs/reference
 """
 
+import asyncio
+import random
+import socket
+import sys
+
 import aiohttp
-from dataclasses import dataclass
+import msgspec
+import orjson
 from datetime import datetime
 from typing import Any
 
 
-@dataclass
-class CreatedObject:
+class CreatedObject(msgspec.Struct):
     object_id: str
     space_id: str
     name: str
 
 
+class _RetryableStatus(Exception):
+    """5xx response with retries left: the server rejected the request,
+    so re-sending is safe for any verb."""
+
+
 class AnytypeClient:
     """Client for interacting with Anytype API."""
     
     # API version from https://developers.anytype.io/docs/reference
     API_VERSION = "2025-05-20"
-    
-    def __init__(self, api_url: str, bearer_token: str, space_id: str):
+
+    # Debounce window for coalescing block-add requests
+    BLOCK_FLUSH_DELAY = 0.02
+
+    # Retry budget for transient connection errors / 5xx responses
+    MAX_RETRIES = 3
+
+    def __init__(
+        self,
+        api_url: str,
+        bearer_token: str,
+        space_id: str,
+        session: aiohttp.ClientSession | None = None,
+    ):
         # Ensure /v1 prefix for API
         base_url = api_url.rstrip("/")
         if not base_url.endswith("/v1"):
@@ -31,23 +53,87 @@ class AnytypeClient:
         self.api_url = base_url
         self.bearer_token = bearer_token
         self.space_id = space_id
-        self._session: aiohttp.ClientSession | None = None
-    
-    @property
-    def headers(self) -> dict[str, str]:
-        return {
+        # Build headers once; every request reuses the same dict
+        self._headers = {
             "Authorization": f"Bearer {self.bearer_token}",
             "Content-Type": "application/json",
             "Anytype-Version": self.API_VERSION,
         }
+        # An injected session is shared with other clients and left open
+        # on close(); without one the client owns a tuned pool of its own
+        self._session = session
+        self._owns_session = session is None
+        self._session_loop: asyncio.AbstractEventLoop | None = None
+        self._timeout = aiohttp.ClientTimeout(total=30, connect=5, sock_read=25)
+        self._session_lock = asyncio.Lock()
+        # Type lookups never change within a session; cache them
+        self._types_cache: list[dict] | None = None
+        self._note_type_id: str | None = None
+        self._types_lock = asyncio.Lock()
+        # Pending block additions, coalesced per object and flushed together
+        self._block_queue: dict[str, list[tuple[dict, asyncio.Future]]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+    
+    @property
+    def headers(self) -> dict[str, str]:
+        return self._headers
     
+    def _session_stale(self, loop: asyncio.AbstractEventLoop) -> bool:
+        return (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not loop
+        )
+
     async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(headers=self.headers)
+        if not self._owns_session:
+            return self._session
+        loop = asyncio.get_running_loop()
+        if self._session_stale(loop):
+            # Double-checked locking: only one coroutine builds the session,
+            # so concurrent callers can't race and leak a connection pool
+            async with self._session_lock:
+                if self._session_stale(loop):
+                    self._session = self._build_session()
+                    self._session_loop = loop
         return self._session
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        # Pool keep-alive connections to the Anytype host so repeated
+        # API calls skip TCP+TLS setup. limit=0 removes the global cap;
+        # per-host limit still bounds concurrency.
+        # c-ares resolver (aiodns) keeps DNS lookups off the thread
+        # pool; fall back to the default resolver where aiodns is
+        # unsupported (Windows) or not installed.
+        resolver: aiohttp.abc.AbstractResolver | None = None
+        if sys.platform != "win32":
+            try:
+                resolver = aiohttp.AsyncResolver()
+            except Exception:
+                resolver = None
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=32,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True,
+            resolver=resolver,
+            family=socket.AF_INET,
+        )
+        return aiohttp.ClientSession(
+            headers=self.headers,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=60),
+            json_serialize=lambda obj: orjson.dumps(obj).decode(),
+        )
     
     async def close(self):
-        if self._session and not self._session.closed:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._block_queue:
+            await self._flush_blocks()
+        if self._owns_session and self._session and not self._session.closed:
             await self._session.close()
     
     async def _request(
@@ -56,40 +142,76 @@ class AnytypeClient:
         endpoint: str, 
         json_data: dict | None = None
     ) -> dict[str, Any]:
-        """Make an API request."""
+        """Make an API request with bounded retry on transient failures."""
         session = await self._get_session()
-        url = f"{self.api_url}{endpoint}"
-        
-        async with session.request(method, url, json=json_data) as response:
-            # Check content type before parsing
-            content_type = response.headers.get("Content-Type", "")
-            
-            if "application/json" in content_type:
-                response_data = await response.json()
-            else:
-                # Handle non-JSON response (likely an error)
-                text = await response.text()
-                raise Exception(f"Anytype API error ({response.status}): {text}")
-            
-            if not response.ok:
-                error_msg = response_data.get("error", {}).get("message", str(response_data))
-                raise Exception(f"Anytype API error ({response.status}): {error_msg}")
-            
-            return response_data
+        url = self.api_url + endpoint
+
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                async with session.request(
+                    method, url, json=json_data,
+                    headers=self._headers, timeout=self._timeout,
+                ) as response:
+                    # Read the body once; error branches slice it directly
+                    # instead of re-reading or pre-parsing
+                    body = await response.read()
+
+                    # Retry 5xx responses while we still have attempts left
+                    if response.status >= 500 and attempt < self.MAX_RETRIES - 1:
+                        raise _RetryableStatus(
+                            f"Anytype API error ({response.status}): "
+                            f"{body[:200].decode('utf-8', 'replace')}"
+                        )
+
+                    if not response.ok:
+                        raise Exception(
+                            f"Anytype API error ({response.status}): "
+                            f"{body[:500].decode('utf-8', 'replace')}"
+                        )
+
+                    return orjson.loads(body)
+            except _RetryableStatus:
+                # Jittered exponential backoff before the next attempt
+                await asyncio.sleep(min(2 ** attempt * 0.1 + random.random() * 0.1, 2.0))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.MAX_RETRIES - 1:
+                    raise
+                # A timed-out or dropped write may already have been
+                # applied server-side, so re-sending a POST could create
+                # duplicate notes or blocks — only GETs retry those.
+                # A refused connection never carried the request, so it
+                # stays retryable for every verb.
+                if method != "GET" and not isinstance(e, aiohttp.ClientConnectorError):
+                    raise
+                await asyncio.sleep(min(2 ** attempt * 0.1 + random.random() * 0.1, 2.0))
     
     async def get_types(self) -> list[dict]:
-        """Get all available types in the space."""
-        response = await self._request("GET", f"/spaces/{self.space_id}/types")
-        return response.get("data", [])
-    
+        """Get all available types in the space (cached after first call)."""
+        if self._types_cache is not None:
+            return self._types_cache
+        async with self._types_lock:
+            # Re-check: another task may have fetched while we waited
+            if self._types_cache is None:
+                response = await self._request("GET", f"/spaces/{self.space_id}/types")
+                self._types_cache = response.get("data", [])
+        return self._types_cache
+
     async def get_note_type_id(self) -> str | None:
-        """Find the Note type ID in the space."""
+        """Find the Note type ID in the space (cached after first lookup)."""
+        if self._note_type_id is not None:
+            return self._note_type_id
         types = await self.get_types()
         for t in types:
             # Look for Note type by name or key
             if t.get("name", "").lower() == "note" or t.get("key") == "ot-note":
-                return t.get("id")
+                self._note_type_id = t.get("id")
+                return self._note_type_id
         return None
+
+    def invalidate_type_cache(self):
+        """Drop cached type data so the next lookup re-fetches from the API."""
+        self._types_cache = None
+        self._note_type_id = None
     
     async def create_object(
         self,
@@ -176,6 +298,10 @@ class AnytypeClient:
         """
         Add a new block to an object.
         
+        Blocks are queued for a short debounce window and flushed together,
+        so several back-to-back additions to the same object go out in one
+        burst instead of serialized round-trips.
+
         Args:
             object_id: ID of the object to add block to
             block_type: Type of block (text, quote, link, etc.)
@@ -185,14 +311,48 @@ class AnytypeClient:
             "type": block_type,
             "content": content,
         }
-        
-        response = await self._request(
-            "POST",
-            f"/spaces/{self.space_id}/objects/{object_id}/blocks",
-            json_data=payload
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._block_queue.setdefault(object_id, []).append((payload, future))
+
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.BLOCK_FLUSH_DELAY,
+                lambda: loop.create_task(self._flush_blocks()),
+            )
+
+        return await future
+
+    async def _flush_blocks(self):
+        """Flush all queued block additions.
+
+        Different objects flush concurrently, but blocks for one object
+        go out strictly in queue order — the blocks endpoint appends in
+        arrival order, so concurrent POSTs would scramble the paragraphs
+        of a multi-block note.
+        """
+        self._flush_handle = None
+        queue, self._block_queue = self._block_queue, {}
+
+        async def flush_one(object_id: str, pending) -> None:
+            for payload, future in pending:
+                try:
+                    result = await self._request(
+                        "POST",
+                        f"/spaces/{self.space_id}/objects/{object_id}/blocks",
+                        json_data=payload,
+                    )
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result.get("data", {}))
+
+        await asyncio.gather(
+            *(flush_one(object_id, pending) for object_id, pending in queue.items())
         )
-        
-        return response.get("data", {})
     
     async def create_voice_note(
         self,
@@ -218,35 +378,47 @@ class AnytypeClient:
         
         # Create title with username and timestamp
         user_part = f"@{username}" if username else "Unknown"
-        title_preview = summary[:40].split("\n")[0]
+        title_preview = summary[:40].split("\n", 1)[0]
         if len(summary) > 40:
             title_preview += "..."
         
         title = f"🎤 [{user_part}] {timestamp.strftime('%Y-%m-%d %H:%M')} - {title_preview}"
         
-        # Build body with summary and full text as quote
-        body = f"""## Summary
-
-{summary}
-
----
+        # Create the note with just the summary so it appears immediately,
+        # then stream the transcription in as quote blocks. Block additions
+        # coalesce in the debounced queue into one concurrent flush.
+        body = "\n".join((
+            "## Summary",
+            "",
+            summary,
+            "",
+            "---",
+            "",
+            "## Full Transcription",
+            "",
+        ))
 
-## Full Transcription
-
-> {full_text.replace(chr(10), chr(10) + '> ')}
-"""
-        
-        return await self.create_object(
+        created = await self.create_object(
             name=title,
             body=body,
             icon_emoji="🎤",
         )
+
+        paragraphs = [p.strip() for p in full_text.split("\n\n") if p.strip()]
+        if created.object_id and paragraphs:
+            await asyncio.gather(*(
+                self.add_block_to_object(created.object_id, "quote", paragraph)
+                for paragraph in paragraphs
+            ))
+
+        return created
     
-async def create_anytype_client(
+def create_anytype_client(
     api_url: str,
-    bearer_token: str, 
-    space_id: str
+    bearer_token: str,
+    space_id: str,
+    session: aiohttp.ClientSession | None = None,
 ) -> AnytypeClient:
     """Factory function to create an Anytype client."""
-    return AnytypeClient(api_url, bearer_token, space_id)
+    return AnytypeClient(api_url, bearer_token, space_id, session=session)
 
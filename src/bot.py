@@ -3,24 +3,34 @@ Telegram bot for voice note transcription and storage in Anytype.
 Also provides API for Chrome extension.
 """
 
+import io
 import os
-import tempfile
+import hashlib
+import socket
+import string
+import sqlite3
+import time
 import logging
 import asyncio
-import json
+import httpx
+import orjson
+import numpy as np
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.filters import Command
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
 from aiohttp import web
+from aiolimiter import AsyncLimiter
 
 from .config import Config, load_config
 from .anytype_client import AnytypeClient, create_anytype_client
 from .transcription import (
-    create_transcription_service, 
-    convert_ogg_to_wav,
+    create_transcription_service,
+    decode_ogg_to_array,
     TranscriptionService,
 )
 from .summarizer import create_summarizer, DeepSeekSummarizer
@@ -33,70 +43,478 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Static reply texts hoisted out of the handlers so each message doesn't
+# rebuild them
+_MD = "Markdown"
+_UNAUTHORIZED = "⛔ You are not authorized to use this bot."
+_WELCOME_TEXT = (
+    "👋 *Добро пожаловать в Voice Notes Bot!*\n\n"
+    "Отправь мне голосовое сообщение и я:\n"
+    "1. 🎤 Транскрибирую его в текст\n"
+    "2. 📝 Создам краткое содержание через AI\n"
+    "3. 💾 Сохраню всё в твой Anytype\n\n"
+    "📹 *Google Meet:*\n"
+    "Нажми «🔌 Подключить расширение» для записи митингов\n\n"
+    "Просто запиши голосовое чтобы начать!"
+)
+_HELP_TEXT = (
+    "📖 *Справка Voice Notes Bot*\n\n"
+    "*🎤 Голосовые заметки:*\n"
+    "Просто отправь голосовое сообщение и бот:\n"
+    "• Транскрибирует речь в текст\n"
+    "• Создаст AI саммари\n"
+    "• Сохранит всё в Anytype\n\n"
+    "*🔍 Умный поиск (RAG):*\n"
+    "Задай вопрос и AI ответит на основе твоих заметок:\n"
+    "• `/ask Что обсуждали на митинге?`\n"
+    "• Или просто напиши вопрос текстом!\n"
+    "• `/sync` — синхронизировать заметки из Anytype\n\n"
+    "*📹 Запись Google Meet:*\n"
+    "1. Нажми «🔌 Подключить расширение»\n"
+    "2. Установи расширение в Chrome\n"
+    "3. Нажми кнопку подключения\n"
+    "4. Открой Google Meet и нажми Record!\n\n"
+    "*Команды:*\n"
+    "• `/ask` — задать вопрос по заметкам\n"
+    "• `/sync` — синхронизировать из Anytype\n"
+    "• `/status` — статус сервисов\n"
+    "• `/extension` — настройка расширения"
+)
+_VOICE_PROMPT_TEXT = (
+    "🎤 *Запись голосового*\n\n"
+    "Нажми на микрофон 🎙️ в поле ввода сообщения\n"
+    "и запиши свою заметку!\n\n"
+    "Я транскрибирую её, создам саммари и сохраню в Anytype."
+)
+_ASK_PROMPT_TEXT = (
+    "🔍 *Задайте вопрос по вашим заметкам*\n\n"
+    "Просто напишите вопрос в чат, например:\n"
+    "• `Что обсуждали на митинге про резюме?`\n"
+    "• `Какие были решения по проекту?`\n"
+    "• `Что нужно сделать до пятницы?`\n\n"
+    "Или используйте команду: `/ask Ваш вопрос`"
+)
+_FALLBACK_TEXT = "💡 Используй кнопки меню внизу или отправь голосовое сообщение!"
+
+# The download row of the /extension keyboard is static; only the
+# connect row varies with the per-user token
+_EXTENSION_DOWNLOAD_ROW = [
+    InlineKeyboardButton(
+        text="📥 Скачать расширение",
+        url="https://github.com/user/anytype-bot/releases",
+    )
+]
+
+
+# Connect page served to the Chrome extension. Compiled once as a
+# string.Template: only token/bot_url vary per request; the CSS/JS live
+# under /static so browsers cache them across connects.
+_CONNECT_PAGE_TMPL = string.Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Anytype Meet Recorder - Connect</title>
+    <meta name="extension-token" content="${token}">
+    <meta name="server-url" content="${bot_url}">
+    <link rel="stylesheet" href="/static/connect.css">
+    <script defer src="/static/connect.js"></script>
+</head>
+<body>
+    <div class="container">
+        <div class="logo">🔌</div>
+        <h1>Anytype Meet Recorder</h1>
+        <div id="status" class="status waiting">
+            <div class="spinner"></div>
+            Ожидание расширения...
+        </div>
+        <p class="instructions" id="instructions">
+            Откройте эту страницу в браузере, где установлено расширение.<br>
+            Оно автоматически подключится.
+        </p>
+        <div class="manual-link" id="manual" style="display:none;">
+            <strong>Или скопируйте ссылку в настройки расширения:</strong><br>
+            ${bot_url}/api/extension/config/${token}
+        </div>
+    </div>
+</body>
+</html>""")
+
+
+# Extension event -> notification template, keyed for O(1) dispatch
+_EVENT_TEMPLATES = {
+    "recording_started": "🎥 Recording started\n📹 {msg}",
+    "recording_stopped": "⏹️ Recording stopped\n📝 Processing...",
+    "intermediate_summary": "📊 {msg}",
+    "saved": "✅ Meeting saved to Anytype!\n📋 {msg}",
+    "error": "❌ Extension error:\n{msg}",
+}
+
+
+@web.middleware
+async def _cors_middleware(request, handler):
+    """Allow the Chrome extension to call the API from any origin."""
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        try:
+            response = await handler(request)
+        except web.HTTPException as ex:
+            response = ex
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Extension-Token'
+    if request.path.startswith('/static/'):
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+# Per-minute cached timestamps: metadata and note titles only need
+# minute resolution, so bulk saves skip a datetime + format per item
+_MINUTE_CACHE: tuple[int, str, str] = (-1, "", "")
+
+
+def _minute_strings() -> tuple[str, str]:
+    """Return (ISO timestamp, 'YYYY-MM-DD HH:MM'), cached per minute."""
+    global _MINUTE_CACHE
+    minute = int(time.time() // 60)
+    if minute != _MINUTE_CACHE[0]:
+        now = datetime.now()
+        _MINUTE_CACHE = (minute, now.isoformat(), now.strftime('%Y-%m-%d %H:%M'))
+    return _MINUTE_CACHE[1], _MINUTE_CACHE[2]
+
+
+def _fingerprint(text: str, n: int = 16) -> bytes:
+    """Content fingerprint for dedup keys (blake2b, GIL released in C)."""
+    return hashlib.blake2b(text.encode(), digest_size=n).digest()
+
+
+async def _read_json(request: web.Request, max_bytes: int = 2_000_000):
+    """Read and parse a JSON body with orjson, capped at max_bytes.
+
+    Raises ``HTTPRequestEntityTooLarge``; handlers re-raise
+    ``web.HTTPException`` ahead of their generic error branch so the 413
+    reaches the client instead of collapsing into a 500.
+    """
+    raw = await request.read()
+    if len(raw) > max_bytes:
+        raise web.HTTPRequestEntityTooLarge(
+            max_size=max_bytes, actual_size=len(raw)
+        )
+    return orjson.loads(raw)
+
+
+def _ojson(data, status: int = 200) -> web.Response:
+    """JSON response serialized with orjson (faster than stdlib json)."""
+    return web.Response(
+        body=orjson.dumps(data),
+        status=status,
+        content_type="application/json",
+    )
+
+
+class StatusUpdater:
+    """Debounced wrapper around ``Message.edit_text``.
+
+    Coalesces rapid stage-transition edits into at most one Telegram API
+    call per ``min_interval``, always showing the latest text.
+    """
+
+    __slots__ = ("message", "min_interval", "_pending_text", "_last_text", "_handle")
+
+    def __init__(self, message: Message, min_interval: float = 0.3):
+        self.message = message
+        self.min_interval = min_interval
+        self._pending_text: str | None = None
+        self._last_text: str | None = None
+        self._handle: asyncio.TimerHandle | None = None
+
+    def update(self, text: str):
+        """Queue text to show; rapid successive updates overwrite each other."""
+        self._pending_text = text
+        if self._handle is None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(
+                self.min_interval,
+                lambda: loop.create_task(self.flush()),
+            )
+
+    async def flush(self):
+        """Edit the message with the latest pending text, if any."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        text = self._pending_text
+        self._pending_text = None
+        if text is None:
+            return
+        # Telegram rejects message texts over 4096 chars; truncating
+        # beats losing the terminal "saved"/"error" status entirely
+        text = text[:4096]
+        if text == self._last_text:
+            return
+        self._last_text = text
+        try:
+            await self.message.edit_text(text)
+        except Exception as e:
+            logger.warning(f"Status edit failed: {e}")
+
 
 class VoiceNotesBot:
     """Main bot class for handling voice messages."""
-    
+
+    # Fixed attribute offsets: every handler reads self.* repeatedly, so
+    # skipping the per-instance __dict__ hash shaves the hot path a bit
+    # (and catches stray attribute typos at assignment time)
+    __slots__ = (
+        "config", "bot", "dp", "_allowed_users", "transcription",
+        "_llm_http", "summarizer", "anytype", "_anytype_ready",
+        "_ffmpeg_sem", "_limiter", "_save_sem", "_main_kb",
+        "_ext_config_bytes", "rag", "_index_q", "_index_workers",
+        "sync_service", "_token_db", "extension_tokens", "_tokens_dirty",
+        "_token_flusher_task", "web_app", "web_runner", "_text_routes",
+        "_stopping", "_connect_parts", "_tg_queue", "_tg_pending",
+        "_tg_worker_task", "_chunk_cache", "_ask_cache", "_ask_cache_version",
+        "_save_seen", "_voice_cache", "_bg_tasks",
+    )
+
+    TOKENS_DB = Path("data/tokens.db")
+    # Legacy JSON store; migrated into SQLite on first load
     TOKENS_FILE = Path("data/extension_tokens.json")
     
     def __init__(self, config: Config):
         self.config = config
-        self.bot = Bot(token=config.telegram_bot_token)
+        # orjson (de)serializes every Telegram payload - getUpdates
+        # batches, keyboards, Markdown texts - far cheaper than stdlib json
+        self.bot = Bot(
+            token=config.telegram_bot_token,
+            session=AiohttpSession(
+                json_loads=orjson.loads,
+                json_dumps=lambda obj: orjson.dumps(obj).decode(),
+            ),
+        )
         self.dp = Dispatcher()
+
+        # Frozen once at init: unauthorized floods cost a single hash
+        # lookup before the rejection reply
+        self._allowed_users = frozenset(config.allowed_user_ids or ())
         
         # Initialize services
         self.transcription: TranscriptionService = create_transcription_service(
             mode=config.whisper_mode,
             model=config.whisper_model,
             api_url=config.whisper_api_url,
+            compute_type=config.whisper_compute_type,
+            beam_size=config.whisper_beam_size,
+            language=config.whisper_language,
         )
         
+        # Shared, capped connection pool for all DeepSeek calls; keep-alive
+        # connections amortize TLS + DNS across /api/extension/* traffic
+        # and bound FD usage under load
+        self._llm_http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=30.0,
+            ),
+        )
+
         self.summarizer: DeepSeekSummarizer = create_summarizer(
             api_key=config.deepseek_api_key,
             api_url=config.deepseek_api_url,
+            http_client=self._llm_http,
         )
         
         self.anytype: AnytypeClient | None = None
-        
+        # Set once the client exists; cleared on shutdown to reject
+        # late work without polling loops
+        self._anytype_ready = asyncio.Event()
+
+        # Bound concurrent ffmpeg conversions so voice-note bursts don't
+        # oversubscribe the CPU; downloads and API calls stay unbounded
+        self._ffmpeg_sem = asyncio.Semaphore(os.cpu_count() or 2)
+
+        # Stay under Telegram's 30 msg/s bot-wide cap with headroom;
+        # all proactive sends go through _send_message
+        self._limiter = AsyncLimiter(max_rate=28, time_period=1.0)
+
+        # Cap concurrent background save pipelines (summarize + Anytype
+        # save) so a burst of meeting saves doesn't hammer DeepSeek
+        self._save_sem = asyncio.Semaphore(2)
+
+        # The main reply keyboard never changes; build it once instead of
+        # allocating markup + buttons on every reply
+        self._main_kb = ReplyKeyboardMarkup(
+            keyboard=[
+                [
+                    KeyboardButton(text="🎤 Записать голосовое"),
+                    KeyboardButton(text="🔌 Подключить расширение"),
+                ],
+                [
+                    KeyboardButton(text="🔍 Спросить AI"),
+                    KeyboardButton(text="🔄 Синхронизировать"),
+                ],
+                [
+                    KeyboardButton(text="📊 Статус"),
+                    KeyboardButton(text="❓ Помощь"),
+                ],
+            ],
+            resize_keyboard=True,
+            input_field_placeholder="Отправьте голосовое или задайте вопрос..."
+        )
+
+        # Outbound notification queue: web handlers enqueue and return
+        # immediately; a worker paces sends through the rate limiter and
+        # collapses superseded per-user updates
+        self._tg_queue: asyncio.Queue = asyncio.Queue()
+        self._tg_pending: dict[tuple[int, str], str] = {}
+        self._tg_worker_task: asyncio.Task | None = None
+
+        # LRU of chunk summaries keyed by content hash, so a replayed or
+        # retried chunk from the extension never costs a second LLM call
+        self._chunk_cache: OrderedDict[bytes, str] = OrderedDict()
+
+        # Transcripts keyed by Telegram file_unique_id: a forwarded or
+        # re-sent voice note skips the download and Whisper entirely
+        self._voice_cache: OrderedDict[str, str] = OrderedDict()
+
+        # Transcript hashes of recently accepted saves: extension
+        # retries of an already-queued meeting are acked without
+        # queueing a second summarize/save run
+        self._save_seen: OrderedDict[bytes, None] = OrderedDict()
+
+        # Strong refs to fire-and-forget tasks; the event loop only
+        # keeps weak refs, so an unreferenced task can be GC'd mid-flight
+        self._bg_tasks: set[asyncio.Task] = set()
+
+        # Semantic answer cache for /ask: (normalized query embedding,
+        # rendered answer) pairs, dropped wholesale when the RAG corpus
+        # changes so stale answers never survive a re-index
+        self._ask_cache: list[tuple[np.ndarray, str]] = []
+        self._ask_cache_version = -1
+
+        # Pre-encoded connect-page fragments, keyed by bot_url
+        self._connect_parts: dict[str, list[bytes]] = {}
+
+        # Extension config never changes after boot; serialize it once
+        self._ext_config_bytes = orjson.dumps({
+            "anytypeApiUrl": config.anytype_api_url,
+            "anytypeBearerToken": config.anytype_bearer_token,
+            "anytypeSpaceId": config.anytype_space_id,
+            "deepseekApiKey": config.deepseek_api_key,
+            "deepseekApiUrl": config.deepseek_api_url,
+        })
+
         # RAG service for semantic search
         self.rag: RAGService = create_rag_service("./data/vectordb")
+        # Notes queue for background RAG indexing (workers start in start())
+        self._index_q: asyncio.Queue = asyncio.Queue(maxsize=64)
+        self._index_workers: list[asyncio.Task] = []
         self.sync_service: SyncService | None = None
         
-        # Extension tokens - maps token to user_id (persisted to disk)
+        # Extension tokens - maps token to user_id. Lookups stay on this
+        # in-memory dict; persistence goes to a WAL-mode SQLite file (via
+        # the debounced write-behind flusher) so tokens survive restarts
+        # and can be shared with other worker processes
+        self._token_db: sqlite3.Connection | None = None
         self.extension_tokens: dict[str, int] = self._load_tokens()
+        self._tokens_dirty = asyncio.Event()
+        self._token_flusher_task: asyncio.Task | None = None
         
+        # Guards stop() against re-entry (e.g. repeated SIGINT)
+        self._stopping = False
+
         # Web app for extension API
-        self.web_app = web.Application()
+        # client_max_size must sit above _read_json's 2 MB cap, or
+        # aiohttp's default 1 MiB limit rejects big transcripts first
+        # with an error the extension can't distinguish from a crash
+        self.web_app = web.Application(client_max_size=4 * 1024 * 1024)
         self.web_runner = None
         self._setup_web_routes()
         
+        # Keyboard-button text -> handler, one hash lookup per message
+        self._text_routes = {
+            "🎤 Записать голосовое": self._prompt_voice,
+            "🔌 Подключить расширение": self._send_extension_setup,
+            "🔍 Спросить AI": self._prompt_ask,
+            "🔄 Синхронизировать": self._handle_sync,
+            "📊 Статус": self._cmd_status,
+            "❓ Помощь": self._cmd_help,
+        }
+
         # Register handlers
         self._register_handlers()
     
+    def _token_conn(self) -> sqlite3.Connection:
+        """Open (once) the SQLite token store."""
+        if self._token_db is None:
+            self.TOKENS_DB.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.TOKENS_DB, check_same_thread=False)
+            # WAL allows concurrent readers, so other workers can look
+            # tokens up while this process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens("
+                "token TEXT PRIMARY KEY, user_id INTEGER NOT NULL)"
+            )
+            self._token_db = conn
+        return self._token_db
+
     def _load_tokens(self) -> dict[str, int]:
-        """Load extension tokens from disk."""
+        """Load extension tokens from the SQLite store."""
         try:
+            conn = self._token_conn()
+            tokens = dict(conn.execute("SELECT token, user_id FROM tokens"))
+
+            # One-time migration from the legacy JSON token file
             if self.TOKENS_FILE.exists():
-                with open(self.TOKENS_FILE, 'r') as f:
-                    data = json.load(f)
-                    logger.info(f"Loaded {len(data)} extension tokens from disk")
-                    return data
+                legacy = orjson.loads(self.TOKENS_FILE.read_bytes())
+                fresh = {t: u for t, u in legacy.items() if t not in tokens}
+                if fresh:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO tokens VALUES(?, ?)",
+                        list(fresh.items()),
+                    )
+                    conn.commit()
+                    tokens.update(fresh)
+                self.TOKENS_FILE.rename(self.TOKENS_FILE.with_suffix(".json.bak"))
+                logger.info(f"Migrated {len(legacy)} legacy tokens to SQLite")
+
+            logger.info(f"Loaded {len(tokens)} extension tokens")
+            return tokens
         except Exception as e:
             logger.warning(f"Failed to load tokens: {e}")
         return {}
+
+    async def _token_flusher(self):
+        """Write-behind persistence for extension tokens.
+
+        Waits for a dirty flag, debounces briefly so bursts collapse into
+        one write, then saves off the event loop.
+        """
+        while True:
+            await self._tokens_dirty.wait()
+            await asyncio.sleep(0.5)
+            self._tokens_dirty.clear()
+            await asyncio.to_thread(self._save_tokens)
     
     def _save_tokens(self):
-        """Save extension tokens to disk."""
+        """Upsert extension tokens into the SQLite store."""
         try:
-            self.TOKENS_FILE.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.TOKENS_FILE, 'w') as f:
-                json.dump(self.extension_tokens, f)
+            conn = self._token_conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO tokens VALUES(?, ?)",
+                list(self.extension_tokens.items()),
+            )
+            conn.commit()
             logger.debug(f"Saved {len(self.extension_tokens)} extension tokens to disk")
         except Exception as e:
             logger.error(f"Failed to save tokens: {e}")
     
     def _setup_web_routes(self):
         """Setup web API routes for extension."""
+        self.web_app.router.add_static('/static', 'static', append_version=True)
         self.web_app.router.add_get('/health', self._web_health)
         self.web_app.router.add_get('/api/extension/config/{token}', self._web_get_config)
         self.web_app.router.add_get('/connect/{token}', self._web_connect_page)
@@ -104,27 +522,37 @@ class VoiceNotesBot:
         self.web_app.router.add_post('/api/extension/save', self._web_save_transcript)
         self.web_app.router.add_post('/api/extension/summarize-chunk', self._web_summarize_chunk)
         
-        # Enable CORS
-        async def cors_middleware(app, handler):
-            async def middleware_handler(request):
-                if request.method == 'OPTIONS':
-                    response = web.Response()
-                else:
-                    try:
-                        response = await handler(request)
-                    except web.HTTPException as ex:
-                        response = ex
-                response.headers['Access-Control-Allow-Origin'] = '*'
-                response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-                response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-                return response
-            return middleware_handler
-        
-        self.web_app.middlewares.append(cors_middleware)
+        # Enable CORS, then authenticate extension calls before body reads
+        self.web_app.middlewares.append(_cors_middleware)
+        self.web_app.middlewares.append(self._auth_middleware)
+
+    @web.middleware
+    async def _auth_middleware(self, request, handler):
+        """Authenticate /api/extension/ POSTs before the body is read.
+
+        An X-Extension-Token header lets bogus requests be rejected
+        without parsing potentially large JSON bodies; handlers fall back
+        to the legacy in-body token when the header is absent.
+        """
+        if request.method == 'POST' and request.path.startswith('/api/extension/'):
+            token = request.headers.get('X-Extension-Token')
+            if token is not None:
+                user_id = self.extension_tokens.get(token)
+                if not user_id:
+                    return _ojson({"error": "Invalid token"}, status=401)
+                request['user_id'] = user_id
+        return await handler(request)
+
+    def _resolve_user(self, request, data: dict) -> int | None:
+        """User id from middleware auth, or the legacy in-body token."""
+        user_id = request.get('user_id')
+        if user_id is None:
+            user_id = self.extension_tokens.get(data.get('token'))
+        return user_id
     
     async def _web_health(self, request):
         """Health check endpoint."""
-        return web.json_response({"status": "ok"})
+        return _ojson({"status": "ok"})
     
     async def _web_connect_page(self, request):
         """Serve the extension auto-connect page."""
@@ -138,124 +566,19 @@ class VoiceNotesBot:
             )
         
         # Get the server URL for API calls
-        bot_url = os.getenv('BOT_PUBLIC_URL', request.url.origin)
-        
-        # Serve a page that the extension will detect and auto-connect
-        html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Anytype Meet Recorder - Connect</title>
-    <meta name="extension-token" content="{token}">
-    <meta name="server-url" content="{bot_url}">
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #1a1a2e 0%, #16213e 50%, #0f3460 100%);
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: #fff;
-        }}
-        .container {{
-            text-align: center;
-            padding: 40px;
-            background: rgba(255,255,255,0.05);
-            border-radius: 20px;
-            backdrop-filter: blur(10px);
-            border: 1px solid rgba(255,255,255,0.1);
-            max-width: 500px;
-        }}
-        .logo {{ font-size: 64px; margin-bottom: 20px; }}
-        h1 {{ font-size: 24px; margin-bottom: 10px; }}
-        .status {{ 
-            padding: 15px 30px; 
-            border-radius: 10px; 
-            margin: 20px 0;
-            font-size: 18px;
-        }}
-        .waiting {{ background: rgba(255,193,7,0.2); border: 1px solid #ffc107; }}
-        .success {{ background: rgba(76,175,80,0.2); border: 1px solid #4caf50; }}
-        .error {{ background: rgba(244,67,54,0.2); border: 1px solid #f44336; }}
-        .spinner {{
-            width: 40px; height: 40px;
-            border: 3px solid rgba(255,255,255,0.3);
-            border-top-color: #fff;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-            margin: 20px auto;
-        }}
-        @keyframes spin {{ to {{ transform: rotate(360deg); }} }}
-        .instructions {{ 
-            color: rgba(255,255,255,0.7); 
-            line-height: 1.6;
-            margin-top: 20px;
-        }}
-        .manual-link {{
-            margin-top: 20px;
-            padding: 10px;
-            background: rgba(0,0,0,0.3);
-            border-radius: 8px;
-            word-break: break-all;
-            font-family: monospace;
-            font-size: 12px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="logo">🔌</div>
-        <h1>Anytype Meet Recorder</h1>
-        <div id="status" class="status waiting">
-            <div class="spinner"></div>
-            Ожидание расширения...
-        </div>
-        <p class="instructions" id="instructions">
-            Откройте эту страницу в браузере, где установлено расширение.<br>
-            Оно автоматически подключится.
-        </p>
-        <div class="manual-link" id="manual" style="display:none;">
-            <strong>Или скопируйте ссылку в настройки расширения:</strong><br>
-            {bot_url}/api/extension/config/{token}
-        </div>
-    </div>
-    <script>
-        const token = "{token}";
-        const serverUrl = "{bot_url}";
-        
-        // Notify extension that we're ready to connect
-        window.postMessage({{
-            type: 'ANYTYPE_EXTENSION_CONNECT',
-            token: token,
-            serverUrl: serverUrl
-        }}, '*');
-        
-        // Listen for extension response
-        window.addEventListener('message', (event) => {{
-            if (event.data.type === 'ANYTYPE_EXTENSION_CONNECTED') {{
-                document.getElementById('status').className = 'status success';
-                document.getElementById('status').innerHTML = '✅ Подключено!';
-                document.getElementById('instructions').textContent = 
-                    'Расширение подключено. Можете закрыть эту страницу и начать запись в Google Meet!';
-            }}
-        }});
-        
-        // Show manual link after 5 seconds if no response
-        setTimeout(() => {{
-            if (!document.getElementById('status').classList.contains('success')) {{
-                document.getElementById('manual').style.display = 'block';
-                document.getElementById('instructions').innerHTML = 
-                    'Расширение не обнаружено.<br>Убедитесь что оно установлено и страница открыта в том же браузере.';
-            }}
-        }}, 5000);
-    </script>
-</body>
-</html>"""
-        
-        return web.Response(text=html, content_type="text/html")
+        bot_url = str(os.getenv('BOT_PUBLIC_URL', request.url.origin))
+
+        # The page is static apart from token/bot_url. Per bot_url (there
+        # is normally exactly one) pre-substitute it and pre-encode the
+        # fragments around ${token}; each request is then a bytes join
+        parts = self._connect_parts.get(bot_url)
+        if parts is None:
+            html = _CONNECT_PAGE_TMPL.safe_substitute(bot_url=bot_url)
+            parts = [p.encode() for p in html.split("${token}")]
+            self._connect_parts[bot_url] = parts
+
+        body = token.encode().join(parts)
+        return web.Response(body=body, content_type="text/html")
     
     async def _web_get_config(self, request):
         """Get extension config by token."""
@@ -263,106 +586,93 @@ class VoiceNotesBot:
         
         user_id = self.extension_tokens.get(token)
         if not user_id:
-            return web.json_response({"error": "Invalid token"}, status=401)
-        
-        # Return config for extension
-        return web.json_response({
-            "anytypeApiUrl": self.config.anytype_api_url,
-            "anytypeBearerToken": self.config.anytype_bearer_token,
-            "anytypeSpaceId": self.config.anytype_space_id,
-            "deepseekApiKey": self.config.deepseek_api_key,
-            "deepseekApiUrl": self.config.deepseek_api_url,
-        })
+            return _ojson({"error": "Invalid token"}, status=401)
+        
+        # Config is immutable after boot; serve the pre-serialized bytes
+        return web.Response(
+            body=self._ext_config_bytes,
+            content_type="application/json",
+        )
     
     async def _web_log_event(self, request):
         """Log event from extension to Telegram."""
         try:
-            data = await request.json()
-            token = data.get('token')
+            data = await _read_json(request)
             event = data.get('event')
             message = data.get('message')
-            
-            user_id = self.extension_tokens.get(token)
+
+            user_id = self._resolve_user(request, data)
             if not user_id:
-                return web.json_response({"error": "Invalid token"}, status=401)
-            
-            # Send notification to user
-            if event == 'recording_started':
-                await self.bot.send_message(
-                    user_id,
-                    f"🎥 Recording started\n📹 {message}"
-                )
-            elif event == 'recording_stopped':
-                await self.bot.send_message(
-                    user_id,
-                    f"⏹️ Recording stopped\n📝 Processing..."
-                )
-            elif event == 'intermediate_summary':
-                # Brief notification for intermediate summaries
-                await self.bot.send_message(
-                    user_id,
-                    f"📊 {message}"
-                )
-            elif event == 'saved':
-                await self.bot.send_message(
-                    user_id,
-                    f"✅ Meeting saved to Anytype!\n📋 {message}"
-                )
-            elif event == 'error':
-                await self.bot.send_message(
-                    user_id,
-                    f"❌ Extension error:\n{message}"
-                )
-            
-            return web.json_response({"success": True})
+                return _ojson({"error": "Invalid token"}, status=401)
+            
+            # Queue the notification; progress events collapse to the
+            # latest and the handler responds without awaiting Telegram
+            template = _EVENT_TEMPLATES.get(event)
+            if template:
+                dedup = event if event == "intermediate_summary" else None
+                self._notify(user_id, template.format(msg=message), dedup_key=dedup)
+
+            return _ojson({"success": True})
             
+        except web.HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Event logging error: {e}")
-            return web.json_response({"error": str(e)}, status=500)
+            return _ojson({"error": str(e)}, status=500)
     
     async def _web_summarize_chunk(self, request):
         """Generate intermediate summary for a chunk of meeting text."""
         try:
-            data = await request.json()
-            token = data.get('token')
-            
-            user_id = self.extension_tokens.get(token)
+            data = await _read_json(request)
+
+            user_id = self._resolve_user(request, data)
             if not user_id:
-                return web.json_response({"error": "Invalid token"}, status=401)
+                return _ojson({"error": "Invalid token"}, status=401)
             
             chunk_number = data.get('chunkNumber', 1)
             text = data.get('text', '')
             meeting_title = data.get('meetingTitle', 'Google Meet')
             
-            if len(text) < 50:
-                return web.json_response({"error": "Text too short for summary"}, status=400)
-            
-            logger.info(f"Generating intermediate summary #{chunk_number} ({len(text)} chars)")
-            
-            # Generate summary for this chunk
-            summary = await self.summarizer.summarize_chunk(text, chunk_number, meeting_title)
-            
-            logger.info(f"Intermediate summary #{chunk_number}: {len(summary)} chars")
-            
-            return web.json_response({
+            # The opening chunk is mostly greetings/setup; require more
+            # substance before spending an LLM round-trip on it
+            min_len = 200 if chunk_number == 1 else 50
+            if len(text) < min_len:
+                return _ojson({"error": "Text too short for summary"}, status=400)
+
+            # Extension retries can replay the exact same chunk; serve
+            # those from the LRU instead of repeating the LLM call
+            cache_key = _fingerprint(f"{chunk_number}\x00{meeting_title}\x00{text}")
+            summary = self._chunk_cache.get(cache_key)
+            if summary is not None:
+                self._chunk_cache.move_to_end(cache_key)
+            else:
+                logger.info(f"Generating intermediate summary #{chunk_number} ({len(text)} chars)")
+                summary = await self.summarizer.summarize_chunk(text, chunk_number, meeting_title)
+                self._chunk_cache[cache_key] = summary
+                if len(self._chunk_cache) > 512:
+                    self._chunk_cache.popitem(last=False)
+                logger.info(f"Intermediate summary #{chunk_number}: {len(summary)} chars")
+            
+            return _ojson({
                 "success": True,
                 "summary": summary,
                 "chunkNumber": chunk_number
             })
             
+        except web.HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Summarize chunk error: {e}", exc_info=True)
-            return web.json_response({"error": str(e)}, status=500)
+            return _ojson({"error": str(e)}, status=500)
     
     async def _web_save_transcript(self, request):
         """Save transcript from extension."""
         try:
-            data = await request.json()
-            token = data.get('token')
-            
-            user_id = self.extension_tokens.get(token)
+            data = await _read_json(request)
+
+            user_id = self._resolve_user(request, data)
             if not user_id:
-                return web.json_response({"error": "Invalid token"}, status=401)
+                return _ojson({"error": "Invalid token"}, status=401)
             
             meeting_title = data.get('meetingTitle', 'Google Meet Recording')
             transcript = data.get('transcript', '')
@@ -373,7 +683,7 @@ class VoiceNotesBot:
             
             if len(transcript) < 10:
                 # Notify user about the problem
-                await self.bot.send_message(
+                await self._send_message(
                     user_id,
                     f"⚠️ Transcript too short ({len(transcript)} chars)\n\n"
                     "Make sure:\n"
@@ -381,127 +691,236 @@ class VoiceNotesBot:
                     "2. Someone was speaking during recording\n"
                     "3. Language is set correctly in Meet settings"
                 )
-                return web.json_response({"error": f"Transcript too short ({len(transcript)} chars). Enable captions in Meet."}, status=400)
-            
-            # Generate final summary
-            if intermediate_summaries and len(intermediate_summaries) > 0:
-                # Combine intermediate summaries for long meetings
-                logger.info(f"Combining {len(intermediate_summaries)} intermediate summaries...")
-                summary = await self.summarizer.combine_summaries(intermediate_summaries, meeting_title)
-            else:
-                # Direct summary for short meetings
-                logger.info(f"Generating summary for {len(transcript)} chars...")
-                summary = await self.summarizer.summarize(transcript)
-            
-            # Save to Anytype
-            if not self.anytype:
-                await self.init_anytype()
-            
-            # Get username from stored mapping if available
-            username = f"user_{user_id}"
-            
-            # Format body with timeline if we have multiple chunks
-            body = f"## Summary\n\n{summary}\n\n---\n\n"
-            
-            if intermediate_summaries and len(intermediate_summaries) > 1:
-                body += "## Meeting Timeline\n\n"
-                for chunk in intermediate_summaries:
-                    chunk_num = chunk.get('chunkNumber', '?')
-                    chunk_summary = chunk.get('summary', '')
-                    body += f"### Part {chunk_num}\n{chunk_summary}\n\n"
-                body += "---\n\n"
-            
-            body += f"## Full Transcript\n\n> {transcript}\n\n---\n*Duration: {duration} minutes*\n"
-            
-            # Create object
-            date_str = datetime.now().strftime('%Y-%m-%d %H:%M')
-            title = f"🎥 {meeting_title} - {date_str}"
-            
-            result = await self.anytype.create_object(
-                name=title,
-                body=body,
-                icon_emoji="🎥"
-            )
-            
-            logger.info(f"Saved meeting note: {result.object_id}")
-            
-            # Auto-index the meeting in RAG
-            await self._index_note(
-                note_id=result.object_id,
-                title=title,
-                body=body
-            )
-            
-            # Notify user
-            summary_preview = summary[:300] + "..." if len(summary) > 300 else summary
-            chunks_info = f"\n📊 Chunks: {len(intermediate_summaries)}" if intermediate_summaries else ""
-            
-            await self.bot.send_message(
-                user_id,
-                f"✅ Meeting saved to Anytype!\n\n"
-                f"📹 {meeting_title}\n"
-                f"⏱️ Duration: {duration} min{chunks_info}\n\n"
-                f"📝 Summary:\n{summary_preview}"
-            )
-            
-            return web.json_response({
-                "success": True,
-                "objectId": result.object_id,
-                "summary": summary
-            })
-            
+                return _ojson({"error": f"Transcript too short ({len(transcript)} chars). Enable captions in Meet."}, status=400)
+
+            # A timed-out extension retries the same POST; the transcript
+            # hash identifies replays so one meeting is summarized once
+            save_key = _fingerprint(f"{user_id}\x00{transcript}")
+            if save_key in self._save_seen:
+                logger.info("Duplicate save request dropped (already queued)")
+                return _ojson({"success": True, "status": "queued"}, status=202)
+            self._save_seen[save_key] = None
+            if len(self._save_seen) > 128:
+                self._save_seen.popitem(last=False)
+
+            # Run the heavy summarize/save pipeline in the background so
+            # the extension isn't left holding the connection through
+            # tens of seconds of LLM calls
+            self._spawn(self._process_save(
+                user_id, meeting_title, transcript, duration,
+                intermediate_summaries, save_key,
+            ))
+
+            return _ojson({"success": True, "status": "queued"}, status=202)
+
+        except web.HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Save transcript error: {e}", exc_info=True)
-            return web.json_response({"error": str(e)}, status=500)
-    
+            return _ojson({"error": str(e)}, status=500)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Create a background task and hold a strong reference to it."""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
+    async def _process_save(
+        self,
+        user_id: int,
+        meeting_title: str,
+        transcript: str,
+        duration: int,
+        intermediate_summaries: list,
+        save_key: bytes,
+    ):
+        """Summarize a meeting transcript, save it to Anytype, and notify
+        the user.
+
+        Runs as a background task decoupled from the HTTP response;
+        concurrency is capped to protect DeepSeek rate limits.
+        """
+        async with self._save_sem:
+            # Warm the Anytype connection while DeepSeek generates the
+            # summary, so the save doesn't pay the handshake serially
+            anytype_task = asyncio.create_task(self._ensure_anytype_warm())
+            try:
+                # Generate final summary
+                if intermediate_summaries and len(intermediate_summaries) > 0:
+                    # Combine intermediate summaries for long meetings
+                    logger.info(f"Combining {len(intermediate_summaries)} intermediate summaries...")
+                    summary = await self.summarizer.combine_summaries(intermediate_summaries, meeting_title)
+                elif len(transcript) < 300:
+                    # Summarizing a tiny transcript just restates it;
+                    # skip the LLM round-trip and token cost
+                    summary = transcript
+                else:
+                    # Direct summary for short meetings
+                    logger.info(f"Generating summary for {len(transcript)} chars...")
+                    summary = await self.summarizer.summarize(transcript)
+
+                # Save to Anytype (warmup ran alongside summarization)
+                await anytype_task
+                await self._wait_anytype()
+
+                # Format body with timeline if we have multiple chunks
+                body = f"## Summary\n\n{summary}\n\n---\n\n"
+
+                if intermediate_summaries and len(intermediate_summaries) > 1:
+                    body += "## Meeting Timeline\n\n"
+                    for chunk in intermediate_summaries:
+                        chunk_num = chunk.get('chunkNumber', '?')
+                        chunk_summary = chunk.get('summary', '')
+                        body += f"### Part {chunk_num}\n{chunk_summary}\n\n"
+                    body += "---\n\n"
+
+                body += f"## Full Transcript\n\n> {transcript}\n\n---\n*Duration: {duration} minutes*\n"
+
+                # Create object
+                date_str = _minute_strings()[1]
+                title = f"🎥 {meeting_title} - {date_str}"
+
+                result = await self.anytype.create_object(
+                    name=title,
+                    body=body,
+                    icon_emoji="🎥"
+                )
+
+                logger.info(f"Saved meeting note: {result.object_id}")
+
+                # Auto-index the meeting in RAG and notify the user; both
+                # are queued to their workers, so the save slot frees up
+                # for the next meeting without waiting on either. Only the
+                # summary plus the head of the transcript is embedded —
+                # the markdown scaffolding in `body` adds nothing to recall
+                self._queue_index(
+                    result.object_id, title,
+                    f"{summary}\n\n{transcript[:4000]}",
+                )
+
+                summary_preview = summary[:300] + "..." if len(summary) > 300 else summary
+                chunks_info = f"\n📊 Chunks: {len(intermediate_summaries)}" if intermediate_summaries else ""
+
+                self._notify(
+                    user_id,
+                    f"✅ Meeting saved to Anytype!\n\n"
+                    f"📹 {meeting_title}\n"
+                    f"⏱️ Duration: {duration} min{chunks_info}\n\n"
+                    f"📝 Summary:\n{summary_preview}"
+                )
+
+            except Exception as e:
+                logger.error(f"Save transcript error: {e}", exc_info=True)
+                if not anytype_task.done():
+                    anytype_task.cancel()
+                # Forget the dedup key so the extension's retry of this
+                # meeting is processed instead of acked and dropped
+                self._save_seen.pop(save_key, None)
+                self._notify(
+                    user_id,
+                    f"❌ Failed to save meeting:\n{str(e)[:200]}"
+                )
+
+    async def _send_message(self, chat_id: int, text: str, **kwargs):
+        """Send a message through the bot-wide rate limiter."""
+        async with self._limiter:
+            return await self.bot.send_message(chat_id, text, **kwargs)
+
+    def _notify(self, user_id: int, text: str, dedup_key: str | None = None):
+        """Queue a notification without awaiting Telegram.
+
+        With a dedup_key, a newer text for the same (user, key) replaces
+        the queued one, so bursts of progress events send only the
+        latest instead of a backlog.
+        """
+        if dedup_key is not None:
+            key = (user_id, dedup_key)
+            if key in self._tg_pending:
+                self._tg_pending[key] = text
+                return
+            self._tg_pending[key] = text
+        self._tg_queue.put_nowait((user_id, text, dedup_key))
+
+    async def _tg_worker(self):
+        """Drain queued notifications at the rate limiter's pace."""
+        while True:
+            user_id, text, dedup_key = await self._tg_queue.get()
+            if dedup_key is not None:
+                text = self._tg_pending.pop((user_id, dedup_key), text)
+            try:
+                await self._send_message(user_id, text)
+            except Exception as e:
+                logger.warning(f"Notification to {user_id} failed: {e}")
+
     async def init_anytype(self):
-        """Initialize Anytype client."""
-        self.anytype = await create_anytype_client(
-            api_url=self.config.anytype_api_url,
-            bearer_token=self.config.anytype_bearer_token,
-            space_id=self.config.anytype_space_id,
-        )
+        """Initialize Anytype client and signal waiters."""
+        if self.anytype is None:
+            self.anytype = create_anytype_client(
+                api_url=self.config.anytype_api_url,
+                bearer_token=self.config.anytype_bearer_token,
+                space_id=self.config.anytype_space_id,
+            )
+        self._anytype_ready.set()
+
+    async def _wait_anytype(self) -> AnytypeClient:
+        """Await the Anytype client, initializing it on first use."""
+        if self.anytype is None:
+            await self.init_anytype()
+        # Cleared during shutdown so late work fails fast instead of
+        # racing the teardown
+        await asyncio.wait_for(self._anytype_ready.wait(), timeout=30)
+        return self.anytype
+
+    async def _ensure_anytype_warm(self):
+        """Initialize the Anytype client and prime its connection pool.
+
+        Run as a background task so DNS/TLS setup overlaps with
+        transcription instead of adding to the critical path.
+        """
+        try:
+            await self._wait_anytype()
+            await self.anytype.get_types()
+        except Exception as e:
+            # Warmup is best-effort; the actual save will surface real errors
+            logger.debug(f"Anytype warmup failed: {e}")
     
     def _is_user_allowed(self, user_id: int) -> bool:
-        """Check if user is allowed to use the bot."""
-        if not self.config.allowed_user_ids:
-            return True  # Allow all if no restrictions
-        return user_id in self.config.allowed_user_ids
+        """Check if user is allowed to use the bot (empty set = allow all)."""
+        return not self._allowed_users or user_id in self._allowed_users
     
     def _generate_extension_token(self, user_id: int) -> str:
         """Generate a token for extension authentication."""
         import secrets
         token = secrets.token_urlsafe(32)
         self.extension_tokens[token] = user_id
-        self._save_tokens()  # Persist to disk
+        self._tokens_dirty.set()  # Persisted by the write-behind flusher
         return token
     
-    def _get_main_keyboard(self) -> ReplyKeyboardMarkup:
-        """Get the main reply keyboard menu."""
-        keyboard = ReplyKeyboardMarkup(
-            keyboard=[
-                [
-                    KeyboardButton(text="🎤 Записать голосовое"),
-                    KeyboardButton(text="🔌 Подключить расширение"),
-                ],
-                [
-                    KeyboardButton(text="🔍 Спросить AI"),
-                    KeyboardButton(text="🔄 Синхронизировать"),
-                ],
-                [
-                    KeyboardButton(text="📊 Статус"),
-                    KeyboardButton(text="❓ Помощь"),
-                ],
-            ],
-            resize_keyboard=True,
-            input_field_placeholder="Отправьте голосовое или задайте вопрос..."
-        )
-        return keyboard
-    
+    def _ask_cache_lookup(self, q_vec: np.ndarray) -> str | None:
+        """Return a cached answer for a near-identical question, if any."""
+        if self._ask_cache_version != self.rag.version:
+            self._ask_cache.clear()
+            self._ask_cache_version = self.rag.version
+            return None
+        if not self._ask_cache:
+            return None
+        sims = np.dot(np.stack([vec for vec, _ in self._ask_cache]), q_vec)
+        best = int(np.argmax(sims))
+        if sims[best] >= 0.95:
+            return self._ask_cache[best][1]
+        return None
+
+    def _ask_cache_store(self, q_vec: np.ndarray, answer: str):
+        """Remember an answered question; oldest entries fall off first."""
+        self._ask_cache.append((q_vec, answer))
+        if len(self._ask_cache) > 1000:
+            del self._ask_cache[0]
+
     async def _handle_ask_question(self, message: Message):
         """Handle asking questions using RAG."""
         if not self._is_user_allowed(message.from_user.id):
-            await message.answer("⛔ You are not authorized to use this bot.")
+            await message.answer(_UNAUTHORIZED)
             return
         
         # Extract question from command
@@ -515,8 +934,8 @@ class VoiceNotesBot:
                 "• `/ask Что обсуждали на последнем митинге?`\n"
                 "• `/ask Какие задачи мне нужно выполнить?`\n"
                 "• `/ask Что говорили про дедлайн?`",
-                parse_mode="Markdown",
-                reply_markup=self._get_main_keyboard(),
+                parse_mode=_MD,
+                reply_markup=self._main_kb,
             )
             return
         
@@ -528,16 +947,29 @@ class VoiceNotesBot:
                 "Сначала нужно синхронизировать заметки:\n"
                 "• Нажмите «🔄 Синхронизировать» или `/sync`\n"
                 "• Или создайте новые голосовые заметки",
-                parse_mode="Markdown",
-                reply_markup=self._get_main_keyboard(),
+                parse_mode=_MD,
+                reply_markup=self._main_kb,
             )
             return
         
         status = await message.answer("🔍 Ищу релевантные заметки...")
         
         try:
+            # Paraphrases of a recently answered question reuse the cached
+            # answer instead of repeating the vector search and LLM call
+            query_embedding = await self.rag.embed(question)
+            q_vec = np.asarray(query_embedding, dtype=np.float32)
+            q_vec /= float(np.linalg.norm(q_vec)) or 1.0
+            cached = self._ask_cache_lookup(q_vec)
+            if cached is not None:
+                await status.edit_text(cached)
+                return
+
             # Search for relevant notes
-            relevant_notes = await self.rag.search(question, n_results=5, min_similarity=0.25)
+            relevant_notes = await self.rag.search(
+                question, n_results=5, min_similarity=0.25,
+                query_embedding=query_embedding,
+            )
             
             if not relevant_notes:
                 await status.edit_text(
@@ -550,19 +982,21 @@ class VoiceNotesBot:
             
             await status.edit_text("🤖 Генерирую ответ на основе заметок...")
             
-            # Build context from relevant notes
-            context_parts = []
-            for i, note in enumerate(relevant_notes, 1):
-                title = note['metadata'].get('title', 'Без названия')
-                date = note['metadata'].get('created', '')[:10]
-                similarity = note['similarity']
-                text = note['text'][:1500]  # Limit text length
-                
-                context_parts.append(
-                    f"[Заметка {i}] {title} ({date}, релевантность: {similarity:.0%})\n{text}"
+            # Build context in one join pass; metadata is read once per
+            # note and text is capped at 1500 chars
+            def _context_entry(i: int, note: dict) -> str:
+                meta = note['metadata']
+                return (
+                    f"[Заметка {i}] {meta.get('title', 'Без названия')} "
+                    f"({meta.get('created', '')[:10]}, "
+                    f"релевантность: {note['similarity']:.0%})\n"
+                    f"{note['text'][:1500]}"
                 )
-            
-            context = "\n\n---\n\n".join(context_parts)
+
+            context = "\n\n---\n\n".join(
+                _context_entry(i, note)
+                for i, note in enumerate(relevant_notes, 1)
+            )
             
             # Generate answer using AI
             answer = await self.summarizer.ask(question, context)
@@ -578,6 +1012,8 @@ class VoiceNotesBot:
                 f"📚 Источники:\n{sources}"
             )
             
+            self._ask_cache_store(q_vec, response_text)
+
             # Send without Markdown to avoid parsing errors from AI response
             await status.edit_text(response_text)
             
@@ -591,14 +1027,13 @@ class VoiceNotesBot:
     async def _handle_sync(self, message: Message):
         """Handle syncing notes from Anytype to RAG."""
         if not self._is_user_allowed(message.from_user.id):
-            await message.answer("⛔ You are not authorized to use this bot.")
+            await message.answer(_UNAUTHORIZED)
             return
         
         status = await message.answer("🔄 Синхронизирую заметки из Anytype...")
         
         try:
-            if not self.anytype:
-                await self.init_anytype()
+            await self._wait_anytype()
             
             if not self.sync_service:
                 self.sync_service = SyncService(self.anytype, self.rag)
@@ -614,363 +1049,539 @@ class VoiceNotesBot:
                 f"❌ Ошибок: {stats['errors']}\n\n"
                 f"📚 Всего в базе: {rag_stats.get('total_notes', 0)} заметок\n\n"
                 f"Теперь можете задавать вопросы через `/ask`!",
-                parse_mode="Markdown",
+                parse_mode=_MD,
             )
             
         except Exception as e:
             logger.error(f"Sync error: {e}", exc_info=True)
             await status.edit_text(f"❌ Ошибка синхронизации: {str(e)[:200]}")
     
-    async def _index_note(self, note_id: str, title: str, body: str):
-        """Index a newly created note in the RAG database."""
+    async def _probe_anytype(self) -> str:
+        """Health-probe the Anytype API, returning a status line."""
         try:
-            full_text = f"{title}\n\n{body}" if body else title
-            await self.rag.add_note(
-                note_id=note_id,
-                text=full_text,
-                metadata={
-                    'title': title,
-                    'source': 'voice_note',
-                    'anytype_id': note_id,
-                    'created': datetime.now().isoformat(),
-                }
-            )
-            logger.info(f"Auto-indexed note: {note_id}")
+            if self.anytype:
+                await self.anytype.get_object(self.config.anytype_notes_object_id)
+                return "✅ Anytype API: Connected"
+            return "⚠️ Anytype API: Not initialized"
         except Exception as e:
-            logger.error(f"Failed to auto-index note: {e}")
+            return f"❌ Anytype API: {str(e)[:50]}"
+
+    def _queue_index(self, note_id: str, title: str, body: str):
+        """Queue a note for background RAG indexing.
+
+        Embedding is CPU-heavy, so it runs on worker tasks off the
+        user-facing path; the bounded queue back-pressures if indexing
+        falls far behind.
+        """
+        try:
+            self._index_q.put_nowait((note_id, title, body))
+        except asyncio.QueueFull:
+            logger.warning(f"Index queue full, dropping note {note_id}")
+
+    async def _index_worker(self):
+        """Drain the index queue in coalesced batches.
+
+        After the first note arrives, up to half a second is spent
+        collecting more (32 max) so a burst of saves shares one
+        embedding forward pass and one Chroma write.
+        """
+        while True:
+            batch = [await self._index_q.get()]
+            deadline = asyncio.get_running_loop().time() + 0.5
+            while len(batch) < 32:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._index_q.get(), remaining)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            try:
+                created = _minute_strings()[0]
+                notes = []
+                for note_id, title, body in batch:
+                    full_text = f"{title}\n\n{body}" if body else title
+                    notes.append((note_id, full_text, {
+                        'title': title,
+                        'source': 'voice_note',
+                        'anytype_id': note_id,
+                        'created': created,
+                    }))
+                await self.rag.add_notes_batch(notes)
+                logger.info(f"Auto-indexed {len(batch)} note(s)")
+            except Exception as e:
+                logger.error(f"Failed to auto-index notes: {e}")
+            finally:
+                for _ in batch:
+                    self._index_q.task_done()
     
     def _register_handlers(self):
-        """Register message handlers."""
+        """Register bound-method handlers with the dispatcher."""
+        self.dp.message.register(self._cmd_start, Command("start"))
+        self.dp.message.register(self._cmd_help, Command("help"))
+        self.dp.message.register(self._cmd_extension, Command("extension"))
+        self.dp.message.register(self._cmd_status, Command("status"))
+        self.dp.message.register(self._cmd_ask, Command("ask"))
+        self.dp.message.register(self._cmd_sync, Command("sync"))
+        self.dp.message.register(self._handle_voice, F.voice)
+        # Known buttons match in the filter (hashed set containment), so
+        # other texts never enter the button handler's frame
+        self.dp.message.register(
+            self._handle_buttons, F.text.in_(frozenset(self._text_routes))
+        )
+        self.dp.message.register(self._handle_text, F.text)
+
+    async def _cmd_start(self, message: Message):
+        if not self._is_user_allowed(message.from_user.id):
+            await message.answer(_UNAUTHORIZED)
+            return
         
-        @self.dp.message(Command("start"))
-        async def cmd_start(message: Message):
-            if not self._is_user_allowed(message.from_user.id):
-                await message.answer("⛔ You are not authorized to use this bot.")
-                return
-            
-            await message.answer(
-                "👋 *Добро пожаловать в Voice Notes Bot!*\n\n"
-                "Отправь мне голосовое сообщение и я:\n"
-                "1. 🎤 Транскрибирую его в текст\n"
-                "2. 📝 Создам краткое содержание через AI\n"
-                "3. 💾 Сохраню всё в твой Anytype\n\n"
-                "📹 *Google Meet:*\n"
-                "Нажми «🔌 Подключить расширение» для записи митингов\n\n"
-                "Просто запиши голосовое чтобы начать!",
-                parse_mode="Markdown",
-                reply_markup=self._get_main_keyboard(),
-            )
+        await message.answer(
+            _WELCOME_TEXT,
+            parse_mode=_MD,
+            reply_markup=self._main_kb,
+        )
+    
+    async def _cmd_help(self, message: Message):
+        if not self._is_user_allowed(message.from_user.id):
+            await message.answer(_UNAUTHORIZED)
+            return
         
-        @self.dp.message(Command("help"))
-        async def cmd_help(message: Message):
-            if not self._is_user_allowed(message.from_user.id):
-                await message.answer("⛔ You are not authorized to use this bot.")
-                return
-            
-            await message.answer(
-                "📖 *Справка Voice Notes Bot*\n\n"
-                "*🎤 Голосовые заметки:*\n"
-                "Просто отправь голосовое сообщение и бот:\n"
-                "• Транскрибирует речь в текст\n"
-                "• Создаст AI саммари\n"
-                "• Сохранит всё в Anytype\n\n"
-                "*🔍 Умный поиск (RAG):*\n"
-                "Задай вопрос и AI ответит на основе твоих заметок:\n"
-                "• `/ask Что обсуждали на митинге?`\n"
-                "• Или просто напиши вопрос текстом!\n"
-                "• `/sync` — синхронизировать заметки из Anytype\n\n"
-                "*📹 Запись Google Meet:*\n"
-                "1. Нажми «🔌 Подключить расширение»\n"
-                "2. Установи расширение в Chrome\n"
-                "3. Нажми кнопку подключения\n"
-                "4. Открой Google Meet и нажми Record!\n\n"
-                "*Команды:*\n"
-                "• `/ask` — задать вопрос по заметкам\n"
-                "• `/sync` — синхронизировать из Anytype\n"
-                "• `/status` — статус сервисов\n"
-                "• `/extension` — настройка расширения",
-                parse_mode="Markdown",
-                reply_markup=self._get_main_keyboard(),
-            )
+        await message.answer(
+            _HELP_TEXT,
+            parse_mode=_MD,
+            reply_markup=self._main_kb,
+        )
+    
+    async def _cmd_extension(self, message: Message):
+        """Setup Chrome extension."""
+        await self._send_extension_setup(message)
+    
+    async def _send_extension_setup(self, message: Message):
+        """Send extension setup message with inline button."""
+        if not self._is_user_allowed(message.from_user.id):
+            await message.answer(_UNAUTHORIZED)
+            return
+        
+        user_id = message.from_user.id
+        token = self._generate_extension_token(user_id)
+        
+        # Get the bot's public URL
+        bot_url = os.getenv('BOT_PUBLIC_URL', 'http://YOUR_SERVER_IP:3000')
         
-        @self.dp.message(Command("extension"))
-        async def cmd_extension(message: Message):
-            """Setup Chrome extension."""
-            await self._send_extension_setup(message)
+        connect_url = f"{bot_url}/connect/{token}"
+        
+        # Create inline keyboard with connect button
+        inline_kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔌 Подключить расширение", url=connect_url)],
+            _EXTENSION_DOWNLOAD_ROW,
+        ])
+        
+        await message.answer(
+            "🔌 *Настройка Chrome расширения*\n\n"
+            "*Шаг 1:* Установи расширение\n"
+            "Скачай папку `chrome-extension` и загрузи в Chrome:\n"
+            "`chrome://extensions` → Режим разработчика → Загрузить\n\n"
+            "*Шаг 2:* Подключи расширение\n"
+            "Нажми кнопку ниже (откроется страница подключения)\n\n"
+            "*Шаг 3:* Записывай митинги!\n"
+            "Открой Google Meet и нажми кнопку Record\n\n"
+            "⚠️ Ссылка персональная — не делись ею!",
+            parse_mode=_MD,
+            reply_markup=inline_kb,
+        )
+    
+    async def _cmd_status(self, message: Message):
+        if not self._is_user_allowed(message.from_user.id):
+            await message.answer(_UNAUTHORIZED)
+            return
+        
+        status_lines = ["📊 **Service Status**\n"]
+
+        # Run all network probes concurrently; /status latency is
+        # max(probe) instead of sum(probe) as more probes get added
+        probe_results = await asyncio.gather(
+            self._probe_anytype(),
+            return_exceptions=True,
+        )
+        for result in probe_results:
+            if isinstance(result, BaseException):
+                status_lines.append(f"❌ Probe failed: {str(result)[:50]}")
+            else:
+                status_lines.append(result)
+
+        # Transcription mode
+        status_lines.append(f"🎤 Transcription: {self.config.whisper_mode} mode")
+        if self.config.whisper_mode == "local":
+            status_lines.append(f"   Model: {self.config.whisper_model}")
+        
+        # DeepSeek
+        status_lines.append("✅ DeepSeek API: Configured")
+        
+        # Extension API
+        status_lines.append("✅ Extension API: Running on port 3000")
+        
+        # RAG stats
+        rag_stats = self.rag.get_stats()
+        status_lines.append(f"\n🧠 **RAG Knowledge Base**")
+        status_lines.append(f"📚 Indexed notes: {rag_stats.get('total_notes', 0)}")
+        status_lines.append(f"🔤 Model: {rag_stats.get('model', 'unknown')}")
+        
+        await message.answer(
+            "\n".join(status_lines), 
+            parse_mode=_MD,
+            reply_markup=self._main_kb,
+        )
+    
+    async def _cmd_ask(self, message: Message):
+        """Handle /ask command for RAG queries."""
+        await self._handle_ask_question(message)
+    
+    async def _cmd_sync(self, message: Message):
+        """Handle /sync command to sync notes from Anytype."""
+        await self._handle_sync(message)
+    
+    async def _handle_voice(self, message: Message):
+        """Handle voice messages."""
+        # Hoist the pydantic attribute walk once; the handler reuses the
+        # bound objects for auth, logging, and the note title
+        user = message.from_user
+        user_id = user.id
+        if not self._is_user_allowed(user_id):
+            await message.answer(_UNAUTHORIZED)
+            return
+
+        logger.info(f"Received voice message from user {user_id}")
         
-        async def _send_extension_setup(message: Message):
-            """Send extension setup message with inline button."""
-            if not self._is_user_allowed(message.from_user.id):
-                await message.answer("⛔ You are not authorized to use this bot.")
+        # Send processing status; intermediate edits are debounced
+        status_msg = await message.answer("🎤 Processing your voice message...")
+        status = StatusUpdater(status_msg)
+
+        # Warm up the Anytype connection while we download/transcribe
+        anytype_task = asyncio.create_task(self._ensure_anytype_warm())
+
+        # Per-block summaries launched while later audio still decodes
+        chunk_tasks: list[asyncio.Task] = []
+
+        try:
+            # Telegram assigns the same file_unique_id to re-sent and
+            # forwarded copies of a voice note, so duplicates reuse the
+            # cached transcript without downloading or decoding anything
+            file_unique_id = message.voice.file_unique_id
+            cached_text = self._voice_cache.get(file_unique_id)
+            if cached_text is not None:
+                self._voice_cache.move_to_end(file_unique_id)
+                logger.info("Voice transcript served from cache")
+                full_text = cached_text
+            else:
+                # Download voice file into memory; voice notes are small
+                # enough that they never need to touch disk
+                status.update("📥 Downloading audio...")
+                file = await self.bot.get_file(message.voice.file_id)
+                ogg_buf = io.BytesIO()
+                await self.bot.download_file(file.file_path, destination=ogg_buf)
+
+                # Backends that take OGG directly consume the buffer;
+                # otherwise decode in-process to a 16 kHz mono float32 array
+                # (no ffmpeg subprocess, no temp WAV file)
+                if getattr(self.transcription, "accepts_ogg", False):
+                    audio_path = ogg_buf
+                else:
+                    status.update("🔄 Converting audio format...")
+                    async with self._ffmpeg_sem:
+                        audio_path = await asyncio.to_thread(
+                            decode_ogg_to_array, ogg_buf
+                        )
+
+                # Transcribe, surfacing partial text as segments confirm
+                # when the backend can stream (edits ride the debounced
+                # status updater, so Telegram traffic stays bounded)
+                status.update("🎤 Transcribing speech to text...")
+                stream = getattr(self.transcription, "stream", None)
+                if stream is not None:
+                    parts: list[str] = []
+                    chunk_start = 0
+                    async for partial in stream(audio_path):
+                        parts.append(partial)
+                        preview = " ".join(parts)
+                        if len(preview) > 300:
+                            preview = "…" + preview[-300:]
+                        status.update(f"🎤 {preview}")
+                        # Map-reduce for long recordings: summarize each
+                        # completed ~2000-char block concurrently with the
+                        # rest of the decode, then combine at the end
+                        block = " ".join(parts[chunk_start:])
+                        if len(block) >= 2000:
+                            chunk_tasks.append(asyncio.create_task(
+                                self.summarizer.summarize_chunk(
+                                    block, len(chunk_tasks) + 1, "Voice note"
+                                )
+                            ))
+                            chunk_start = len(parts)
+                    full_text = " ".join(parts)
+                else:
+                    full_text = await self.transcription.transcribe(audio_path)
+
+                if full_text.strip():
+                    self._voice_cache[file_unique_id] = full_text
+                    if len(self._voice_cache) > 256:
+                        self._voice_cache.popitem(last=False)
+
+            if not full_text.strip():
+                status.update("⚠️ Could not transcribe the audio. Please try again with clearer speech.")
+                await status.flush()
                 return
             
-            user_id = message.from_user.id
-            token = self._generate_extension_token(user_id)
-            
-            # Get the bot's public URL
-            bot_url = os.getenv('BOT_PUBLIC_URL', 'http://YOUR_SERVER_IP:3000')
-            
-            connect_url = f"{bot_url}/connect/{token}"
+            logger.info(f"Transcribed {len(full_text)} characters")
+            
+            # Summarize: long recordings reduce their block summaries
+            # (most already finished during transcription); short ones
+            # go through a single summarize call
+            status.update("🤖 Generating AI summary...")
+            if chunk_tasks:
+                tail = " ".join(parts[chunk_start:])
+                if tail.strip():
+                    chunk_tasks.append(asyncio.create_task(
+                        self.summarizer.summarize_chunk(
+                            tail, len(chunk_tasks) + 1, "Voice note"
+                        )
+                    ))
+                chunk_summaries = await asyncio.gather(*chunk_tasks)
+                summary = await self.summarizer.combine_summaries(
+                    [
+                        {"chunkNumber": i, "summary": s}
+                        for i, s in enumerate(chunk_summaries, 1)
+                    ],
+                    "Voice note",
+                )
+            else:
+                # Stream the summary into the status message as tokens
+                # arrive; edits ride the debounced updater, so Telegram
+                # sees at most one edit per interval
+                summary_parts: list[str] = []
+                async for delta in self.summarizer.summarize_stream(full_text):
+                    summary_parts.append(delta)
+                    status.update(f"🤖 {''.join(summary_parts)[:3500]}")
+                summary = "".join(summary_parts)
             
-            # Create inline keyboard with connect button
-            inline_kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔌 Подключить расширение", url=connect_url)],
-                [InlineKeyboardButton(text="📥 Скачать расширение", url="https://github.com/user/anytype-bot/releases")]
-            ])
+            logger.info(f"Generated summary: {len(summary)} characters")
             
-            await message.answer(
-                "🔌 *Настройка Chrome расширения*\n\n"
-                "*Шаг 1:* Установи расширение\n"
-                "Скачай папку `chrome-extension` и загрузи в Chrome:\n"
-                "`chrome://extensions` → Режим разработчика → Загрузить\n\n"
-                "*Шаг 2:* Подключи расширение\n"
-                "Нажми кнопку ниже (откроется страница подключения)\n\n"
-                "*Шаг 3:* Записывай митинги!\n"
-                "Открой Google Meet и нажми кнопку Record\n\n"
-                "⚠️ Ссылка персональная — не делись ею!",
-                parse_mode="Markdown",
-                reply_markup=inline_kb,
+            # Save to Anytype
+            status.update("💾 Saving to Anytype...")
+
+            await anytype_task
+
+            # Get username for the note title
+            username = user.username or user.first_name or f"user_{user_id}"
+            
+            # Create the voice note object
+            created_object = await self.anytype.create_voice_note(
+                summary=summary,
+                full_text=full_text,
+                timestamp=datetime.now(),
+                username=username,
             )
-        
-        @self.dp.message(Command("status"))
-        async def cmd_status(message: Message):
-            if not self._is_user_allowed(message.from_user.id):
-                await message.answer("⛔ You are not authorized to use this bot.")
-                return
             
-            status_lines = ["📊 **Service Status**\n"]
+            logger.info(f"Created Anytype object: {created_object.object_id}")
             
-            # Check Anytype connection
-            try:
-                if self.anytype:
-                    await self.anytype.get_object(self.config.anytype_notes_object_id)
-                    status_lines.append("✅ Anytype API: Connected")
-                else:
-                    status_lines.append("⚠️ Anytype API: Not initialized")
-            except Exception as e:
-                status_lines.append(f"❌ Anytype API: {str(e)[:50]}")
-            
-            # Transcription mode
-            status_lines.append(f"🎤 Transcription: {self.config.whisper_mode} mode")
-            if self.config.whisper_mode == "local":
-                status_lines.append(f"   Model: {self.config.whisper_model}")
-            
-            # DeepSeek
-            status_lines.append("✅ DeepSeek API: Configured")
+            # Auto-index the note in RAG (background workers)
+            self._queue_index(
+                created_object.object_id,
+                created_object.name,
+                f"{summary}\n\n{full_text}",
+            )
             
-            # Extension API
-            status_lines.append("✅ Extension API: Running on port 3000")
+            # Send success message with preview (no Markdown to avoid parsing issues)
+            preview_text = full_text[:200] + "..." if len(full_text) > 200 else full_text
             
-            # RAG stats
-            rag_stats = self.rag.get_stats()
-            status_lines.append(f"\n🧠 **RAG Knowledge Base**")
-            status_lines.append(f"📚 Indexed notes: {rag_stats.get('total_notes', 0)}")
-            status_lines.append(f"🔤 Model: {rag_stats.get('model', 'unknown')}")
+            status.update(
+                f"✅ Voice note saved!\n\n"
+                f"📝 Summary:\n{summary}\n\n"
+                f"📄 Full text:\n{preview_text}\n\n"
+                f"🔗 Saved to Anytype",
+            )
+            await status.flush()
             
-            await message.answer(
-                "\n".join(status_lines), 
-                parse_mode="Markdown",
-                reply_markup=self._get_main_keyboard(),
+        except Exception as e:
+            logger.error(f"Error processing voice message: {e}", exc_info=True)
+            for task in chunk_tasks:
+                if not task.done():
+                    task.cancel()
+            # Don't use Markdown for errors - they may contain special chars
+            error_text = str(e)[:200]  # Truncate long errors
+            status.update(
+                f"❌ Error processing voice message:\n{error_text}\n\n"
+                "Please try again or contact support.",
             )
+            await status.flush()
         
-        @self.dp.message(Command("ask"))
-        async def cmd_ask(message: Message):
-            """Handle /ask command for RAG queries."""
-            await self._handle_ask_question(message)
-        
-        @self.dp.message(Command("sync"))
-        async def cmd_sync(message: Message):
-            """Handle /sync command to sync notes from Anytype."""
-            await self._handle_sync(message)
-        
-        @self.dp.message(F.voice)
-        async def handle_voice(message: Message):
-            """Handle voice messages."""
-            if not self._is_user_allowed(message.from_user.id):
-                await message.answer("⛔ You are not authorized to use this bot.")
-                return
-            
-            user_id = message.from_user.id
-            logger.info(f"Received voice message from user {user_id}")
-            
-            # Send processing status
-            status_msg = await message.answer("🎤 Processing your voice message...")
-            
-            temp_dir = tempfile.mkdtemp()
-            ogg_path = os.path.join(temp_dir, f"voice_{message.message_id}.ogg")
-            
-            try:
-                # Download voice file
-                await status_msg.edit_text("📥 Downloading audio...")
-                file = await self.bot.get_file(message.voice.file_id)
-                await self.bot.download_file(file.file_path, ogg_path)
-                
-                # Convert to WAV (better compatibility)
-                await status_msg.edit_text("🔄 Converting audio format...")
-                wav_path = await convert_ogg_to_wav(ogg_path)
-                
-                # Transcribe
-                await status_msg.edit_text("🎤 Transcribing speech to text...")
-                full_text = await self.transcription.transcribe(wav_path)
-                
-                if not full_text.strip():
-                    await status_msg.edit_text("⚠️ Could not transcribe the audio. Please try again with clearer speech.")
-                    return
-                
-                logger.info(f"Transcribed {len(full_text)} characters")
-                
-                # Summarize
-                await status_msg.edit_text("🤖 Generating AI summary...")
-                summary = await self.summarizer.summarize(full_text)
-                
-                logger.info(f"Generated summary: {len(summary)} characters")
-                
-                # Save to Anytype
-                await status_msg.edit_text("💾 Saving to Anytype...")
-                
-                if not self.anytype:
-                    await self.init_anytype()
-                
-                # Get username for the note title
-                user = message.from_user
-                username = user.username or user.first_name or f"user_{user.id}"
-                
-                # Create the voice note object
-                created_object = await self.anytype.create_voice_note(
-                    summary=summary,
-                    full_text=full_text,
-                    timestamp=datetime.now(),
-                    username=username,
-                )
-                
-                logger.info(f"Created Anytype object: {created_object.object_id}")
-                
-                # Auto-index the note in RAG
-                await self._index_note(
-                    note_id=created_object.object_id,
-                    title=created_object.name,
-                    body=f"{summary}\n\n{full_text}"
-                )
-                
-                # Send success message with preview (no Markdown to avoid parsing issues)
-                preview_text = full_text[:200] + "..." if len(full_text) > 200 else full_text
-                
-                await status_msg.edit_text(
-                    f"✅ Voice note saved!\n\n"
-                    f"📝 Summary:\n{summary}\n\n"
-                    f"📄 Full text:\n{preview_text}\n\n"
-                    f"🔗 Saved to Anytype",
-                )
-                
-            except Exception as e:
-                logger.error(f"Error processing voice message: {e}", exc_info=True)
-                # Don't use Markdown for errors - they may contain special chars
-                error_text = str(e)[:200]  # Truncate long errors
-                await status_msg.edit_text(
-                    f"❌ Error processing voice message:\n{error_text}\n\n"
-                    "Please try again or contact support.",
-                )
-            
-            finally:
-                # Cleanup temp files
-                try:
-                    for f in Path(temp_dir).glob("*"):
-                        f.unlink()
-                    Path(temp_dir).rmdir()
-                except Exception:
-                    pass
-        
-        @self.dp.message(F.text)
-        async def handle_text(message: Message):
-            """Handle text messages and keyboard buttons."""
-            if not self._is_user_allowed(message.from_user.id):
-                await message.answer("⛔ You are not authorized to use this bot.")
-                return
-            
-            text = message.text.strip()
-            
-            # Handle keyboard buttons
-            if text == "🎤 Записать голосовое":
-                await message.answer(
-                    "🎤 *Запись голосового*\n\n"
-                    "Нажми на микрофон 🎙️ в поле ввода сообщения\n"
-                    "и запиши свою заметку!\n\n"
-                    "Я транскрибирую её, создам саммари и сохраню в Anytype.",
-                    parse_mode="Markdown",
-                    reply_markup=self._get_main_keyboard(),
-                )
-            elif text == "🔌 Подключить расширение":
-                await _send_extension_setup(message)
-            elif text == "📊 Статус":
-                await cmd_status(message)
-            elif text == "❓ Помощь":
-                await cmd_help(message)
-            elif text == "🔍 Спросить AI":
-                await message.answer(
-                    "🔍 *Задайте вопрос по вашим заметкам*\n\n"
-                    "Просто напишите вопрос в чат, например:\n"
-                    "• `Что обсуждали на митинге про резюме?`\n"
-                    "• `Какие были решения по проекту?`\n"
-                    "• `Что нужно сделать до пятницы?`\n\n"
-                    "Или используйте команду: `/ask Ваш вопрос`",
-                    parse_mode="Markdown",
-                    reply_markup=self._get_main_keyboard(),
-                )
-            elif text == "🔄 Синхронизировать":
-                await self._handle_sync(message)
-            elif text.startswith('/') or len(text) < 10:
-                await message.answer(
-                    "💡 Используй кнопки меню внизу или отправь голосовое сообщение!",
-                    reply_markup=self._get_main_keyboard(),
-                )
-            else:
-                # Treat any other text as a question for RAG
-                message.text = f"/ask {text}"
-                await self._handle_ask_question(message)
+        finally:
+            if not anytype_task.done():
+                anytype_task.cancel()
     
+    async def _prompt_voice(self, message: Message):
+        """Explain how to record a voice note."""
+        await message.answer(
+            _VOICE_PROMPT_TEXT,
+            parse_mode=_MD,
+            reply_markup=self._main_kb,
+        )
+
+    async def _prompt_ask(self, message: Message):
+        """Explain how to ask the RAG a question."""
+        await message.answer(
+            _ASK_PROMPT_TEXT,
+            parse_mode=_MD,
+            reply_markup=self._main_kb,
+        )
+
+    async def _handle_buttons(self, message: Message):
+        """Dispatch a known keyboard button to its handler."""
+        if not self._is_user_allowed(message.from_user.id):
+            await message.answer(_UNAUTHORIZED)
+            return
+        await self._text_routes[message.text](message)
+
+    async def _handle_text(self, message: Message):
+        """Handle free-form text (questions and fallback hints)."""
+        if not self._is_user_allowed(message.from_user.id):
+            await message.answer(_UNAUTHORIZED)
+            return
+        
+        text = message.text.strip()
+
+        if text.startswith('/') or len(text) < 10:
+            await message.answer(_FALLBACK_TEXT, reply_markup=self._main_kb)
+        else:
+            # Treat any other text as a question for RAG
+            message.text = f"/ask {text}"
+            await self._handle_ask_question(message)
+
     async def start(self):
         """Start the bot."""
-        logger.info("Starting Voice Notes Bot...")
+        loop = asyncio.get_running_loop()
+        logger.info(f"Starting Voice Notes Bot ({type(loop).__module__} event loop)...")
         
-        # Initialize Anytype client
+        # Initialize Anytype client; the pool warmup is independent of
+        # web-server bring-up, so it runs concurrently with it below
         await self.init_anytype()
-        
-        # Start web server
+
+        async def _warmup():
+            try:
+                await self.anytype._request("GET", f"/spaces/{self.config.anytype_space_id}")
+            except Exception as e:
+                logger.warning(f"Anytype warmup at startup failed: {e}")
+
+        async def _warmup_embedder():
+            # Load the model and push one dummy encode through it so the
+            # first /ask or voice note doesn't pay the multi-second model
+            # load plus cold torch kernels on its critical path
+            try:
+                from .rag_service import get_embedder
+                await asyncio.to_thread(
+                    lambda: get_embedder().encode("query: warmup")
+                )
+                logger.info("Embedding model warmed up")
+            except Exception as e:
+                logger.warning(f"Embedder warmup at startup failed: {e}")
+
+        warmup_task = asyncio.create_task(_warmup())
+        self._spawn(_warmup_embedder())
+
+        # Persist extension tokens in the background
+        self._token_flusher_task = asyncio.create_task(self._token_flusher())
+
+        # Notification dispatch worker
+        self._tg_worker_task = asyncio.create_task(self._tg_worker())
+
+        # RAG indexing worker (embedding runs off the user-facing path);
+        # a single worker lets bursts coalesce into one batch
+        self._index_workers = [
+            asyncio.create_task(self._index_worker())
+        ]
+
+        # Start web server on a pre-bound SO_REUSEPORT socket: extra
+        # worker processes can bind the same port and the kernel
+        # load-balances accepts across them
         self.web_runner = web.AppRunner(self.web_app)
         await self.web_runner.setup()
-        site = web.TCPSite(self.web_runner, '0.0.0.0', 3000)
-        await site.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.bind(('0.0.0.0', 3000))
+        # Deep backlog absorbs connection bursts during Telegram peaks
+        sock.listen(2048)
+        sock.setblocking(False)
+        site = web.SockSite(self.web_runner, sock)
+        await asyncio.gather(site.start(), warmup_task)
         logger.info("Extension API running on port 3000")
-        
-        # Start polling
-        await self.dp.start_polling(self.bot)
+
+        # Start polling. A 30 s long poll means idle periods cost one
+        # held getUpdates instead of a reconnect per empty poll, and
+        # allowed_updates filters non-message updates server-side
+        await self.dp.start_polling(
+            self.bot,
+            polling_timeout=30,
+            allowed_updates=["message"],
+        )
     
     async def stop(self):
-        """Stop the bot and cleanup."""
+        """Stop the bot and cleanup (idempotent)."""
+        if self._stopping:
+            return
+        self._stopping = True
         logger.info("Stopping Voice Notes Bot...")
-        
+        self._anytype_ready.clear()
+
+        if self._token_flusher_task:
+            self._token_flusher_task.cancel()
+            if self._tokens_dirty.is_set():
+                self._save_tokens()
+        if self._token_db is not None:
+            self._token_db.close()
+
+        if self._tg_worker_task:
+            self._tg_worker_task.cancel()
+
+        # Let queued notes finish indexing, then stop the workers;
+        # capped so one stuck embedding batch can't hang shutdown
+        if self._index_workers:
+            try:
+                await asyncio.wait_for(self._index_q.join(), timeout=10)
+            except asyncio.TimeoutError:
+                logger.warning("Index queue did not drain before shutdown")
+            for worker in self._index_workers:
+                worker.cancel()
+
+        # Fan out the independent teardowns instead of serializing them;
+        # each close gets its own 5 s cap so one hung session can't
+        # stall shutdown indefinitely
+        closers = [
+            self.summarizer.close(),
+            self._llm_http.aclose(),
+            self.bot.session.close(),
+        ]
         if self.web_runner:
-            await self.web_runner.cleanup()
-        
+            closers.append(self.web_runner.cleanup())
         if self.anytype:
-            await self.anytype.close()
-        
-        await self.summarizer.close()
-        await self.bot.session.close()
+            closers.append(self.anytype.close())
+        transcription_close = getattr(self.transcription, "close", None)
+        if transcription_close:
+            closers.append(transcription_close())
+        await asyncio.gather(
+            *(asyncio.wait_for(closer, timeout=5) for closer in closers),
+            return_exceptions=True,
+        )
 
 
 async def main():
     """Main entry point."""
-    config = load_config()
-    
-    # Validate config
-    if not config.telegram_bot_token:
-        raise ValueError("TELEGRAM_BOT_TOKEN is required")
-    if not config.anytype_bearer_token:
-        raise ValueError("ANYTYPE_BEARER_TOKEN is required")
-    if not config.deepseek_api_key:
-        raise ValueError("DEEPSEEK_API_KEY is required")
-    
+    config = load_config()  # validates required fields itself
+
     bot = VoiceNotesBot(config)
     
     try:
@@ -981,4 +1592,9 @@ async def main():
 
 if __name__ == "__main__":
     import asyncio
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass  # uvloop is optional (Linux/macOS only)
     asyncio.run(main())
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Config:
     # Telegram
     telegram_bot_token: str
@@ -25,13 +25,16 @@ class Config:
     whisper_mode: str  # 'local' or 'api'
     whisper_api_url: str | None
     whisper_model: str
+    whisper_compute_type: str | None  # CTranslate2 compute type, None = auto
+    whisper_beam_size: int  # 1 = greedy decode, fastest; 5 = openai default
+    whisper_language: str | None  # ISO 639-1 hint, None = auto-detect per file
 
 
 def load_config() -> Config:
     allowed_ids_str = os.getenv("ALLOWED_USER_IDS", "")
     allowed_user_ids = [int(uid.strip()) for uid in allowed_ids_str.split(",") if uid.strip()]
     
-    return Config(
+    config = Config(
         telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN", ""),
         allowed_user_ids=allowed_user_ids,
         anytype_api_url=os.getenv("ANYTYPE_API_URL", "http://89.40.5.115:31012"),
@@ -43,8 +46,21 @@ def load_config() -> Config:
         whisper_mode=os.getenv("WHISPER_MODE", "local"),
         whisper_api_url=os.getenv("WHISPER_API_URL"),
         whisper_model=os.getenv("WHISPER_MODEL", "base"),
+        whisper_compute_type=os.getenv("WHISPER_COMPUTE_TYPE"),
+        whisper_beam_size=int(os.getenv("WHISPER_BEAM_SIZE", "1")),
+        whisper_language=os.getenv("WHISPER_LANGUAGE"),
     )
 
+    # Fail fast at the boundary so the bot never starts half-configured
+    if not config.telegram_bot_token:
+        raise ValueError("TELEGRAM_BOT_TOKEN is required")
+    if not config.anytype_bearer_token:
+        raise ValueError("ANYTYPE_BEARER_TOKEN is required")
+    if not config.deepseek_api_key:
+        raise ValueError("DEEPSEEK_API_KEY is required")
+
+    return config
+
 
 
 
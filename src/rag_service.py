@@ -5,8 +5,11 @@ Uses ChromaDB for vector storage and sentence-transformers for embeddings.
 Optimized for low-memory servers (8GB RAM).
 """
 
+import os
+import hashlib
 import logging
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 from datetime import datetime
@@ -18,10 +21,55 @@ _embedder = None
 _chroma_client = None
 
 
+class _FastEmbedEncoder:
+    """encode()-compatible wrapper over fastembed's ONNX int8 runtime.
+
+    fastembed runs the same e5 weights through ONNX Runtime with dynamic
+    int8 quantization — roughly 3x faster per encode on CPU than eager
+    PyTorch, with outputs already L2-normalized.
+    """
+
+    def __init__(self, model_name: str):
+        from fastembed import TextEmbedding
+        # Check the supported list up front: TextEmbedding raises for
+        # unknown ids anyway, but this gives a message that names the
+        # model instead of a generic registry error
+        supported = {m["model"] for m in TextEmbedding.list_supported_models()}
+        if model_name not in supported:
+            raise ValueError(
+                f"{model_name} is not in fastembed's supported model list"
+            )
+        self._model = TextEmbedding(model_name=model_name)
+
+    def encode(self, texts, **kwargs):
+        import numpy as np
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        vectors = np.asarray(list(self._model.embed(items)))
+        return vectors[0] if single else vectors
+
+
 def get_embedder():
     """Lazy-load the embedding model to save memory."""
     global _embedder
     if _embedder is None:
+        # EMBEDDING_BACKEND=onnx opts into the quantized ONNX runtime
+        # (pip install fastembed); default stays on sentence-transformers
+        if os.getenv("EMBEDDING_BACKEND", "st") == "onnx":
+            try:
+                logger.info("Loading ONNX embedding model (multilingual-e5-small)...")
+                _embedder = _FastEmbedEncoder('intfloat/multilingual-e5-small')
+                logger.info("Embedding model loaded!")
+                return _embedder
+            except Exception as e:
+                # Not just ImportError: fastembed raises ValueError for
+                # model ids outside its supported list, and the download
+                # can fail too — any of these must fall back rather than
+                # crash every embed call
+                logger.warning(
+                    f"EMBEDDING_BACKEND=onnx unavailable ({e}); "
+                    "falling back to sentence-transformers"
+                )
         logger.info("Loading embedding model (multilingual-e5-small)...")
         from sentence_transformers import SentenceTransformer
         # Using small model to save RAM (~0.8GB instead of 1.5GB)
@@ -30,6 +78,32 @@ def get_embedder():
     return _embedder
 
 
+def _split_text(text: str, max_chars: int = 1200, overlap: int = 150) -> list[str]:
+    """Split text into overlapping windows sized for e5's 512-token cap.
+
+    Character-based splitting on whitespace boundaries approximates the
+    token limit closely enough without running the tokenizer twice; the
+    overlap keeps sentences that straddle a boundary retrievable from
+    both sides.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + max_chars
+        if end < len(text):
+            # Back up to the last whitespace so words stay whole
+            cut = text.rfind(" ", start + max_chars - 200, end)
+            if cut > start:
+                end = cut
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = end - overlap
+    return chunks
+
+
 class RAGService:
     """
     RAG service for semantic search over notes.
@@ -52,6 +126,19 @@ class RAGService:
         self.db_path.mkdir(parents=True, exist_ok=True)
         self._collection = None
         self._initialized = False
+        # Bumped on every write so callers can invalidate caches that
+        # depend on the corpus contents
+        self.version = 0
+        # Tracked incrementally so search/status don't pay a Chroma
+        # metadata scan per collection.count() call
+        self._approx_count = 0
+        # Embeddings get their own narrow pool instead of the shared
+        # default executor, so audio decoding and file I/O can't queue
+        # ahead of them (torch already parallelizes inside each encode)
+        self._embed_pool = ThreadPoolExecutor(
+            max_workers=max(1, (os.cpu_count() or 2) // 2),
+            thread_name_prefix="embed",
+        )
     
     def _get_collection(self):
         """Get or create the ChromaDB collection."""
@@ -65,7 +152,8 @@ class RAGService:
                 name="notes",
                 metadata={"hnsw:space": "cosine"}
             )
-            logger.info(f"ChromaDB collection ready, {self._collection.count()} documents")
+            self._approx_count = self._collection.count()
+            logger.info(f"ChromaDB collection ready, {self._approx_count} documents")
         
         return self._collection
     
@@ -89,51 +177,149 @@ class RAGService:
         if not text or len(text.strip()) < 20:
             logger.warning(f"Note {note_id} too short, skipping")
             return False
-        
+        # Single notes ride the batch path so chunking, hashing, and
+        # upserts live in one place
+        return await self.add_notes_batch([(note_id, text, metadata)]) > 0
+    
+    async def add_notes_batch(
+        self,
+        notes: list[tuple[str, str, dict[str, Any] | None]],
+    ) -> int:
+        """
+        Index several notes in one embedding pass and one Chroma write.
+
+        Batching amortizes the model's forward pass and the HNSW insert
+        cost across all notes instead of paying per item. Long notes are
+        split into overlapping windows and stored as one vector per
+        window under ids "<note_id>::<i>" — e5 truncates at 512 tokens,
+        so a single vector would silently drop everything past the first
+        few paragraphs.
+
+        Args:
+            notes: (note_id, text, metadata) tuples
+
+        Returns:
+            Number of notes indexed
+        """
+        items = [
+            (note_id, text, metadata)
+            for note_id, text, metadata in notes
+            if text and len(text.strip()) >= 20
+        ]
+        if not items:
+            return 0
+
         try:
-            # Run embedding in thread pool (CPU-intensive)
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None,
-                lambda: get_embedder().encode(text).tolist()
-            )
-            
             collection = self._get_collection()
-            
-            # Prepare metadata
-            meta = metadata or {}
-            meta['indexed_at'] = datetime.now().isoformat()
-            meta['text_length'] = len(text)
-            
-            # ChromaDB doesn't like None values
-            meta = {k: v for k, v in meta.items() if v is not None}
-            
-            # Upsert (add or update)
-            # First try to delete existing
+
+            # Skip notes whose content hash already sits in the index:
+            # a re-sync over an unchanged corpus then costs one Chroma
+            # read instead of a full re-embedding pass
+            hashes = {
+                note_id: hashlib.sha256(text.encode()).hexdigest()
+                for note_id, text, _ in items
+            }
             try:
-                collection.delete(ids=[note_id])
+                existing = collection.get(
+                    ids=[f"{note_id}::0" for note_id in hashes],
+                    include=["metadatas"],
+                )
+                unchanged = set()
+                for meta in existing["metadatas"] or []:
+                    if not meta:
+                        continue
+                    parent = meta.get('parent_id')
+                    if parent and meta.get('content_sha') == hashes.get(parent):
+                        unchanged.add(parent)
+            except Exception:
+                unchanged = set()
+            items = [item for item in items if item[0] not in unchanged]
+            if unchanged:
+                logger.info(f"Skipping {len(unchanged)} unchanged note(s)")
+            if not items:
+                return 0
+
+            # Clear previous chunks (and any legacy single-vector entry)
+            # for the notes being re-indexed, so shrunken notes don't
+            # leave stale tails behind
+            parent_ids = [note_id for note_id, _, _ in items]
+            try:
+                collection.delete(where={"parent_id": {"$in": parent_ids}})
             except Exception:
                 pass
-            
-            collection.add(
-                ids=[note_id],
-                documents=[text],
-                metadatas=[meta],
-                embeddings=[embedding]
+            try:
+                collection.delete(ids=parent_ids)
+            except Exception:
+                pass
+
+            indexed_at = datetime.now().isoformat()
+            ids = []
+            texts = []
+            metas = []
+            for note_id, text, metadata in items:
+                windows = _split_text(text)
+                for ix, window in enumerate(windows):
+                    meta = dict(metadata or {})
+                    meta['indexed_at'] = indexed_at
+                    meta['text_length'] = len(text)
+                    meta['content_sha'] = hashes[note_id]
+                    meta['parent_id'] = note_id
+                    meta['chunk_ix'] = ix
+                    meta['total_chunks'] = len(windows)
+                    ids.append(f"{note_id}::{ix}")
+                    texts.append(window)
+                    metas.append({k: v for k, v in meta.items() if v is not None})
+
+            # e5 models expect a "passage:" prefix on indexed text;
+            # one batched forward pass amortizes tokenization and
+            # kernel-launch overhead across the whole list
+            prefixed = [f"passage: {window}" for window in texts]
+            loop = asyncio.get_event_loop()
+            embeddings = await loop.run_in_executor(
+                self._embed_pool,
+                lambda: get_embedder().encode(
+                    prefixed,
+                    batch_size=32,
+                    show_progress_bar=False,
+                    normalize_embeddings=True,
+                ).tolist()
             )
-            
-            logger.info(f"Indexed note {note_id} ({len(text)} chars)")
-            return True
-            
+
+            collection.upsert(
+                ids=ids,
+                documents=texts,
+                metadatas=metas,
+                embeddings=embeddings
+            )
+
+            self._approx_count += len(ids)
+            self.version += 1
+            logger.info(
+                f"Indexed {len(items)} note(s) as {len(ids)} chunk(s) in one batch"
+            )
+            return len(items)
+
         except Exception as e:
-            logger.error(f"Error indexing note {note_id}: {e}")
-            return False
-    
+            logger.error(f"Error batch-indexing notes: {e}")
+            return 0
+
+    async def embed(self, text: str) -> list[float]:
+        """Embed a search query off the event loop (CPU-intensive)."""
+        loop = asyncio.get_event_loop()
+        # e5 models pair "query:" on searches with "passage:" on notes
+        return await loop.run_in_executor(
+            self._embed_pool,
+            lambda: get_embedder().encode(
+                f"query: {text}", normalize_embeddings=True
+            ).tolist()
+        )
+
     async def search(
         self,
         query: str,
         n_results: int = 5,
-        min_similarity: float = 0.3
+        min_similarity: float = 0.3,
+        query_embedding: list[float] | None = None,
     ) -> list[dict[str, Any]]:
         """
         Search for notes similar to the query.
@@ -142,6 +328,8 @@ class RAGService:
             query: Search query (natural language)
             n_results: Maximum number of results
             min_similarity: Minimum similarity threshold (0-1)
+            query_embedding: Precomputed embedding of the query, if the
+                caller already has one (skips a second encode pass)
         
         Returns:
             List of matching notes with text, metadata, and similarity score
@@ -150,28 +338,24 @@ class RAGService:
             return []
         
         try:
-            # Create query embedding
-            loop = asyncio.get_event_loop()
-            query_embedding = await loop.run_in_executor(
-                None,
-                lambda: get_embedder().encode(query).tolist()
-            )
+            if query_embedding is None:
+                query_embedding = await self.embed(query)
             
             collection = self._get_collection()
             
-            if collection.count() == 0:
+            if self._approx_count == 0:
                 logger.info("No documents in collection")
                 return []
             
-            # Search
+            # Over-fetch at chunk granularity, then fold hits back to
+            # their parent note keeping the best-matching chunk
             results = collection.query(
                 query_embeddings=[query_embedding],
-                n_results=min(n_results, collection.count()),
+                n_results=min(n_results * 4, self._approx_count),
                 include=["documents", "metadatas", "distances"]
             )
             
-            # Process results
-            notes = []
+            best: dict[str, dict[str, Any]] = {}
             for i, doc in enumerate(results['documents'][0]):
                 # ChromaDB returns distance, convert to similarity
                 distance = results['distances'][0][i]
@@ -180,12 +364,20 @@ class RAGService:
                 if similarity < min_similarity:
                     continue
                 
-                notes.append({
-                    'id': results['ids'][0][i],
-                    'text': doc,
-                    'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                    'similarity': round(similarity, 3)
-                })
+                meta = results['metadatas'][0][i] if results['metadatas'] else {}
+                parent = (meta or {}).get('parent_id') or results['ids'][0][i]
+                current = best.get(parent)
+                if current is None or similarity > current['similarity']:
+                    best[parent] = {
+                        'id': parent,
+                        'text': doc,
+                        'metadata': meta,
+                        'similarity': round(similarity, 3)
+                    }
+            
+            notes = sorted(
+                best.values(), key=lambda n: n['similarity'], reverse=True
+            )[:n_results]
             
             logger.info(f"Search '{query[:50]}...' found {len(notes)} results")
             return notes
@@ -198,7 +390,13 @@ class RAGService:
         """Delete a note from the vector database."""
         try:
             collection = self._get_collection()
+            try:
+                collection.delete(where={"parent_id": note_id})
+            except Exception:
+                pass
             collection.delete(ids=[note_id])
+            self._approx_count = max(0, self._approx_count - 1)
+            self.version += 1
             logger.info(f"Deleted note {note_id}")
             return True
         except Exception as e:
@@ -208,9 +406,9 @@ class RAGService:
     def get_stats(self) -> dict[str, Any]:
         """Get statistics about the vector database."""
         try:
-            collection = self._get_collection()
+            self._get_collection()
             return {
-                'total_notes': collection.count(),
+                'total_notes': self._approx_count,
                 'db_path': str(self.db_path),
                 'model': 'multilingual-e5-small'
             }
@@ -224,6 +422,8 @@ class RAGService:
             client = chromadb.PersistentClient(path=str(self.db_path))
             client.delete_collection("notes")
             self._collection = None
+            self._approx_count = 0
+            self.version += 1
             logger.warning("Cleared all notes from vector database!")
             return True
         except Exception as e:
@@ -257,6 +457,7 @@ class SyncService:
         logger.info("Starting full sync from Anytype...")
         
         stats = {'synced': 0, 'skipped': 0, 'errors': 0}
+        pending: list[tuple[str, str, dict[str, Any]]] = []
         
         try:
             # Search for all Note objects
@@ -307,26 +508,24 @@ class SyncService:
                     # Use name or first part of snippet as title
                     title = name if name else (snippet[:50] + "..." if len(snippet) > 50 else snippet)
                     
-                    # Index the note
-                    success = await self.rag.add_note(
-                        note_id=obj_id,
-                        text=full_text,
-                        metadata={
-                            'title': title,
-                            'source': 'anytype',
-                            'anytype_id': obj_id,
-                        }
-                    )
-                    
-                    if success:
-                        stats['synced'] += 1
-                    else:
-                        stats['skipped'] += 1
+                    pending.append((obj_id, full_text, {
+                        'title': title,
+                        'source': 'anytype',
+                        'anytype_id': obj_id,
+                    }))
                         
                 except Exception as e:
                     logger.error(f"Error syncing object {obj.get('id')}: {e}")
                     stats['errors'] += 1
             
+            # Index in batches: one embedding pass and one Chroma write
+            # per chunk instead of a round-trip per note
+            for start in range(0, len(pending), 64):
+                chunk = pending[start:start + 64]
+                indexed = await self.rag.add_notes_batch(chunk)
+                stats['synced'] += indexed
+                stats['skipped'] += len(chunk) - indexed
+            
             logger.info(f"Sync complete: {stats}")
             return stats
             
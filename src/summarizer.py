@@ -2,25 +2,96 @@
 DeepSeek API integration for text summarization.
 """
 
+import hashlib
+from collections import OrderedDict
+from typing import AsyncIterator
+
+import httpx
 from openai import AsyncOpenAI
 
+# System prompts hoisted to module constants: beyond skipping per-call
+# string building, a byte-identical prompt prefix is what lets DeepSeek's
+# automatic context caching reuse the prefill KV across calls.
+_SUMMARIZE_PROMPT = """You are a helpful assistant that creates concise summaries of voice message transcriptions.
+
+Your task:
+1. Create a clear, concise summary of the main points
+2. Keep the summary in the same language as the original text
+3. Preserve key information, names, dates, and action items
+4. Use bullet points for multiple distinct topics
+5. Be concise but don't lose important details
+
+Format your response as a clean summary without any preamble like "Here's a summary:" - just provide the summary directly."""
+
+_CHUNK_PROMPT = """You are a meeting summarizer. Create a brief summary of this meeting segment.
+Focus on:
+- Key points discussed
+- Decisions made
+- Action items mentioned
+- Important names or topics
+
+Be concise (2-4 sentences). Write in the same language as the transcript."""
+
+_COMBINE_PROMPT = """You are a meeting summarizer. You will receive summaries of different parts of a long meeting.
+Create a cohesive final summary that:
+- Covers all key points from all parts
+- Highlights important decisions and action items
+- Maintains chronological flow where relevant
+- Is comprehensive but concise
+
+Write in the same language as the input summaries."""
+
+_ASK_PROMPT = """You are a helpful assistant that answers questions based on the user's notes and meeting transcripts.
+
+Rules:
+1. ONLY use information from the provided context (notes) to answer
+2. If the context doesn't contain relevant information, say so honestly
+3. Keep answers concise but informative
+4. Cite which note the information comes from when possible
+5. Respond in the same language as the question
+
+Be helpful and accurate. Don't make up information that isn't in the notes."""
+
 
 class DeepSeekSummarizer:
     """Summarizer using DeepSeek API (OpenAI-compatible)."""
-    
-    def __init__(self, api_key: str, api_url: str = "https://api.deepseek.com"):
+
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str = "https://api.deepseek.com",
+        http_client: httpx.AsyncClient | None = None,
+    ):
         """
         Initialize DeepSeek summarizer.
-        
+
         Args:
             api_key: DeepSeek API key
             api_url: DeepSeek API URL (default: https://api.deepseek.com)
+            http_client: Optional shared httpx client; lets the bot pool
+                keep-alive connections across all DeepSeek calls
         """
         self.client = AsyncOpenAI(
             api_key=api_key,
             base_url=f"{api_url}/v1" if not api_url.endswith("/v1") else api_url,
+            http_client=http_client,
         )
         self.model = "deepseek-chat"
+        # Response cache keyed by content hash: a re-sent voice note or
+        # re-run transcript returns its summary without an API call
+        self._cache: OrderedDict[bytes, str] = OrderedDict()
+    
+    def _cache_get(self, kind: str, text: str) -> tuple[bytes, str | None]:
+        key = hashlib.sha256(f"{self.model}|{kind}|{text}".encode()).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+        return key, cached
+
+    def _cache_put(self, key: bytes, value: str):
+        self._cache[key] = value
+        if len(self._cache) > 1024:
+            self._cache.popitem(last=False)
     
     async def summarize(self, text: str, language: str = "auto") -> str:
         """
@@ -33,16 +104,9 @@ class DeepSeekSummarizer:
         Returns:
             Summary of the text
         """
-        system_prompt = """You are a helpful assistant that creates concise summaries of voice message transcriptions.
-
-Your task:
-1. Create a clear, concise summary of the main points
-2. Keep the summary in the same language as the original text
-3. Preserve key information, names, dates, and action items
-4. Use bullet points for multiple distinct topics
-5. Be concise but don't lose important details
-
-Format your response as a clean summary without any preamble like "Here's a summary:" - just provide the summary directly."""
+        key, cached = self._cache_get("summarize", text)
+        if cached is not None:
+            return cached
 
         user_prompt = f"""Please summarize the following voice message transcription:
 
@@ -55,15 +119,69 @@ Provide a concise summary."""
         response = await self.client.chat.completions.create(
             model=self.model,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _SUMMARIZE_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.3,
             max_tokens=1000,
         )
         
-        return response.choices[0].message.content or ""
+        summary = response.choices[0].message.content or ""
+        if summary:
+            self._cache_put(key, summary)
+        return summary
     
+    async def summarize_stream(self, text: str) -> AsyncIterator[str]:
+        """
+        Summarize, yielding text deltas as DeepSeek streams them.
+
+        Lets callers surface the summary progressively (time to first
+        token instead of full completion time). A cache hit yields the
+        whole stored summary at once.
+
+        Args:
+            text: Text to summarize
+
+        Yields:
+            Incremental summary fragments, in order
+        """
+        key, cached = self._cache_get("summarize", text)
+        if cached is not None:
+            yield cached
+            return
+
+        user_prompt = f"""Please summarize the following voice message transcription:
+
+---
+{text}
+---
+
+Provide a concise summary."""
+
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": _SUMMARIZE_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.3,
+            max_tokens=1000,
+            stream=True,
+        )
+
+        parts: list[str] = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        summary = "".join(parts)
+        if summary:
+            self._cache_put(key, summary)
+
     async def summarize_chunk(self, text: str, chunk_number: int, meeting_title: str) -> str:
         """
         Generate a brief summary for a chunk of meeting content.
@@ -77,15 +195,6 @@ Provide a concise summary."""
         Returns:
             Brief summary of the chunk
         """
-        system_prompt = """You are a meeting summarizer. Create a brief summary of this meeting segment.
-Focus on:
-- Key points discussed
-- Decisions made
-- Action items mentioned
-- Important names or topics
-
-Be concise (2-4 sentences). Write in the same language as the transcript."""
-
         user_prompt = f"""Summarize segment #{chunk_number} of meeting "{meeting_title}":
 
 {text}"""
@@ -93,7 +202,7 @@ Be concise (2-4 sentences). Write in the same language as the transcript."""
         response = await self.client.chat.completions.create(
             model=self.model,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _CHUNK_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.3,
@@ -119,14 +228,9 @@ Be concise (2-4 sentences). Write in the same language as the transcript."""
             for i, s in enumerate(intermediate_summaries)
         )
         
-        system_prompt = """You are a meeting summarizer. You will receive summaries of different parts of a long meeting.
-Create a cohesive final summary that:
-- Covers all key points from all parts
-- Highlights important decisions and action items
-- Maintains chronological flow where relevant
-- Is comprehensive but concise
-
-Write in the same language as the input summaries."""
+        key, cached = self._cache_get("combine", f"{meeting_title}\x00{summaries_text}")
+        if cached is not None:
+            return cached
 
         user_prompt = f"""Create a final summary for meeting "{meeting_title}" from these part summaries:
 
@@ -135,14 +239,17 @@ Write in the same language as the input summaries."""
         response = await self.client.chat.completions.create(
             model=self.model,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _COMBINE_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.3,
             max_tokens=1500,
         )
         
-        return response.choices[0].message.content or ""
+        summary = response.choices[0].message.content or ""
+        if summary:
+            self._cache_put(key, summary)
+        return summary
     
     async def ask(self, question: str, context: str, language: str = "auto") -> str:
         """
@@ -156,17 +263,6 @@ Write in the same language as the input summaries."""
         Returns:
             AI-generated answer based on context
         """
-        system_prompt = """You are a helpful assistant that answers questions based on the user's notes and meeting transcripts.
-
-Rules:
-1. ONLY use information from the provided context (notes) to answer
-2. If the context doesn't contain relevant information, say so honestly
-3. Keep answers concise but informative
-4. Cite which note the information comes from when possible
-5. Respond in the same language as the question
-
-Be helpful and accurate. Don't make up information that isn't in the notes."""
-
         user_prompt = f"""Based on my notes below, please answer this question:
 
 QUESTION: {question}
@@ -181,7 +277,7 @@ Please provide a helpful answer based only on the information in my notes."""
         response = await self.client.chat.completions.create(
             model=self.model,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _ASK_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.4,
@@ -195,9 +291,13 @@ Please provide a helpful answer based only on the information in my notes."""
         await self.client.close()
 
 
-def create_summarizer(api_key: str, api_url: str = "https://api.deepseek.com") -> DeepSeekSummarizer:
+def create_summarizer(
+    api_key: str,
+    api_url: str = "https://api.deepseek.com",
+    http_client: httpx.AsyncClient | None = None,
+) -> DeepSeekSummarizer:
     """Factory function to create a DeepSeek summarizer."""
-    return DeepSeekSummarizer(api_key, api_url)
+    return DeepSeekSummarizer(api_key, api_url, http_client=http_client)
 
 
 
@@ -6,19 +6,75 @@ Supports:
 2. External Whisper API (compatible with openai-whisper-asr-webservice)
 """
 
+import io
 import os
+import functools
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import aiohttp
+import aiofiles
 import asyncio
 from pathlib import Path
-from typing import Protocol
+from typing import AsyncIterator, BinaryIO, Protocol
+
+# Audio input: a filesystem path or an in-memory/file-like binary stream.
+# Small Telegram voice notes stay in memory and never touch disk.
+AudioSource = str | BinaryIO
+
+# Sentinel marking the end of a streamed transcription
+_STREAM_END = object()
+
+# Inference gets its own executor so a 30-second decode can't pin the
+# default pool's threads and starve unrelated blocking work (audio
+# decode, file I/O); width matches the CTranslate2 worker count
+_WHISPER_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="whisper")
+
+
+def _rewind(audio: AudioSource) -> AudioSource:
+    """Rewind file-like audio so it can be consumed from the start."""
+    if hasattr(audio, "seek"):
+        audio.seek(0)
+    return audio
+
+
+def _as_bytes(audio: AudioSource) -> bytes:
+    """Materialize an audio source as bytes (for upload/pipeline input)."""
+    if isinstance(audio, (str, os.PathLike)):
+        with open(audio, "rb") as f:
+            return f.read()
+    _rewind(audio)
+    return audio.read()
+
+
+@functools.lru_cache(maxsize=4)
+def _load_whisper_model(
+    model_size: str, device: str, compute_type: str, num_workers: int
+):
+    """Load (or return the cached) faster-whisper model.
+
+    Module-level cache so every service instance with the same settings
+    shares one CTranslate2 model — the multi-second load happens once per
+    process and CT2 reuses its buffers across calls.
+    """
+    from faster_whisper import WhisperModel
+
+    return WhisperModel(
+        model_size,
+        device=device,
+        compute_type=compute_type,
+        num_workers=num_workers,
+    )
 
 
 class TranscriptionService(Protocol):
     """Protocol for transcription services."""
-    
-    async def transcribe(self, audio_path: str) -> str:
-        """Transcribe audio file to text."""
+
+    # Whether the backend can ingest OGG/Opus directly (skips WAV conversion)
+    accepts_ogg: bool
+
+    async def transcribe(self, audio: AudioSource) -> str:
+        """Transcribe an audio path or binary stream to text."""
         ...
 
 
@@ -31,19 +87,62 @@ class LocalWhisperService:
     
     Install: pip install faster-whisper
     """
-    
-    def __init__(self, model_size: str = "base", device: str = "auto"):
+
+    # faster-whisper decodes OGG/Opus natively via ffmpeg/av
+    accepts_ogg = True
+
+    # CTranslate2 translator workers; >1 lets concurrent voice notes
+    # overlap on-device instead of queueing behind a single worker
+    NUM_WORKERS = 2
+
+    def __init__(
+        self,
+        model_size: str = "base",
+        device: str = "auto",
+        compute_type: str | None = None,
+        beam_size: int = 1,
+        language: str | None = None,
+    ):
         """
         Initialize local Whisper service.
         
         Args:
             model_size: Model size (tiny, base, small, medium, large-v3)
             device: Device to use (cpu, cuda, or auto)
+            compute_type: CTranslate2 compute type (int8, int8_float16,
+                float16, ...); None picks int8 on CPU, float16 on GPU
+            beam_size: Decode beam width. 1 (greedy) is 2-3x faster than
+                the openai default of 5 with negligible quality loss on
+                short, clear voice messages; raise it if accuracy on
+                noisy audio matters more than latency
+            language: ISO 639-1 code (e.g. "ru"). Pinning the language
+                skips the 30-second detection pass Whisper otherwise
+                runs before decoding; None keeps auto-detect
         """
         self.model_size = model_size
         self.device = device
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.language = language
         self._model = None
+        self._batched = None
         self._available = None
+        # Guards lazy model construction: warmup and a first request on
+        # different executor threads must not both instantiate a model
+        self._load_lock = threading.Lock()
+        # Bound concurrent inference to the CTranslate2 worker count;
+        # calls beyond that queue rather than contending on-device
+        self._model_sem = threading.BoundedSemaphore(self.NUM_WORKERS)
+        # Load the model off the critical path so the first voice note
+        # doesn't pay the multi-second load
+        threading.Thread(target=self._prewarm, daemon=True).start()
+
+    def _prewarm(self):
+        try:
+            self._get_model()
+        except Exception:
+            # Missing install or download failure surfaces on first use
+            pass
     
     def _check_available(self) -> bool:
         """Check if faster-whisper is available."""
@@ -64,60 +163,234 @@ class LocalWhisperService:
             )
         
         if self._model is None:
-            from faster_whisper import WhisperModel
-            
-            # Determine compute type based on device
-            if self.device == "auto":
-                try:
-                    import torch
-                    device = "cuda" if torch.cuda.is_available() else "cpu"
-                except ImportError:
-                    device = "cpu"
-            else:
-                device = self.device
-            
-            compute_type = "float16" if device == "cuda" else "int8"
-            
-            self._model = WhisperModel(
-                self.model_size,
-                device=device,
-                compute_type=compute_type,
-            )
+            # Double-checked: lru_cache dedupes the result but not the
+            # work, so without this two cold-start threads could each
+            # load a multi-hundred-MB model
+            with self._load_lock:
+                if self._model is None:
+                    # Determine compute type based on device
+                    if self.device == "auto":
+                        try:
+                            import torch
+                            device = "cuda" if torch.cuda.is_available() else "cpu"
+                        except ImportError:
+                            device = "cpu"
+                    else:
+                        device = self.device
+                    
+                    # int8_float16 on GPU keeps float16 quality at about
+                    # a quarter of the weight memory; CPU stays on int8
+                    compute_type = self.compute_type or (
+                        "int8_float16" if device == "cuda" else "int8"
+                    )
+                    
+                    self._model = _load_whisper_model(
+                        self.model_size, device, compute_type, self.NUM_WORKERS
+                    )
         
         return self._model
+
+    def _get_batched_pipeline(self):
+        """Wrap the model in BatchedInferencePipeline where available.
+
+        The pipeline runs VAD-segmented chunks through the encoder in
+        batches instead of one segment at a time; on older
+        faster-whisper versions without it, plain transcribe is used.
+        """
+        if self._batched is None:
+            model = self._get_model()
+            with self._load_lock:
+                if self._batched is None:
+                    try:
+                        from faster_whisper import BatchedInferencePipeline
+                        self._batched = BatchedInferencePipeline(model=model)
+                    except ImportError:
+                        self._batched = False
+        return self._batched or None
     
-    async def transcribe(self, audio_path: str) -> str:
+    async def transcribe(self, audio: AudioSource) -> str:
         """
-        Transcribe audio file to text using faster-whisper.
-        
+        Transcribe audio to text using faster-whisper.
+
         Args:
-            audio_path: Path to audio file (supports various formats)
-        
+            audio: Path to an audio file or a binary stream
+                (faster-whisper decodes both)
+
         Returns:
             Transcribed text
         """
-        # Run in executor to not block event loop
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._transcribe_sync, audio_path)
-    
-    def _transcribe_sync(self, audio_path: str) -> str:
+        # Run on the dedicated inference executor so CPU/GPU-bound
+        # decoding never blocks the event loop or queues behind
+        # unrelated work on the default pool
+        return await asyncio.get_running_loop().run_in_executor(
+            _WHISPER_EXECUTOR, self._transcribe_sync, audio
+        )
+
+    def _transcribe_sync(self, audio: AudioSource) -> str:
         """Synchronous transcription."""
         model = self._get_model()
-        
-        segments, info = model.transcribe(
-            audio_path,
-            beam_size=5,
-            language=None,  # Auto-detect language
-            vad_filter=True,  # Filter out non-speech
-        )
-        
-        # Combine all segments
-        text_parts = []
-        for segment in segments:
-            text_parts.append(segment.text.strip())
-        
+        pipeline = self._get_batched_pipeline()
+
+        with self._model_sem:
+            if pipeline is not None:
+                segments, info = pipeline.transcribe(
+                    _rewind(audio),
+                    batch_size=8,
+                    beam_size=self.beam_size,
+                    language=self.language,
+                    vad_filter=True,
+                )
+            else:
+                segments, info = model.transcribe(
+                    _rewind(audio),
+                    beam_size=self.beam_size,
+                    language=self.language,  # None = auto-detect
+                    vad_filter=True,  # Filter out non-speech
+                    # Voice notes are independent utterances; carrying the
+                    # previous window's text costs time and invites loops
+                    condition_on_previous_text=False,
+                    temperature=0,
+                )
+
+            # Combine all segments (decoding happens lazily during
+            # iteration, so it stays under the lock)
+            text_parts = []
+            for segment in segments:
+                text_parts.append(segment.text.strip())
+
         return " ".join(text_parts)
 
+    async def stream(self, audio: AudioSource) -> AsyncIterator[str]:
+        """
+        Yield transcript segments as they are decoded.
+
+        faster-whisper decodes lazily while iterating segments, so a
+        worker thread feeds confirmed text into an asyncio queue and
+        callers can surface partial transcripts instead of waiting for
+        the whole file.
+
+        Args:
+            audio: Path to an audio file or a binary stream
+
+        Yields:
+            Transcribed text, one segment at a time
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def worker():
+            try:
+                pipeline = self._get_batched_pipeline()
+                with self._model_sem:
+                    if pipeline is not None:
+                        # Same batched encoder path as transcribe(); it
+                        # still yields segments lazily, so streaming
+                        # callers get partial text as batches finish
+                        segments, info = pipeline.transcribe(
+                            _rewind(audio),
+                            batch_size=8,
+                            beam_size=self.beam_size,
+                            language=self.language,
+                            vad_filter=True,
+                        )
+                    else:
+                        segments, info = self._get_model().transcribe(
+                            _rewind(audio),
+                            beam_size=self.beam_size,
+                            language=self.language,
+                            vad_filter=True,
+                            condition_on_previous_text=False,
+                            temperature=0,
+                        )
+                    for segment in segments:
+                        loop.call_soon_threadsafe(
+                            queue.put_nowait, segment.text.strip()
+                        )
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        _WHISPER_EXECUTOR.submit(worker)
+
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item:
+                yield item
+
+
+class InsanelyFastWhisperService:
+    """
+    GPU transcription via transformers' ASR pipeline (insanely-fast-whisper
+    setup) with Whisper large-v3-turbo.
+
+    Uses Flash-Attention 2 plus chunked batched decoding, which is roughly
+    an order of magnitude faster than sequential decoding on capable GPUs.
+
+    Install: pip install transformers accelerate flash-attn
+    """
+
+    accepts_ogg = True
+
+    def __init__(self, model_name: str = "openai/whisper-large-v3-turbo"):
+        """
+        Initialize the pipeline-backed service.
+
+        Args:
+            model_name: HF model id (default: openai/whisper-large-v3-turbo)
+        """
+        self.model_name = model_name
+        self._pipeline = None
+        self._pipeline_lock = threading.Lock()
+
+    def _get_pipeline(self):
+        """Lazy load the transformers ASR pipeline."""
+        if self._pipeline is None:
+            try:
+                import torch
+                from transformers import pipeline
+            except ImportError as e:
+                raise ImportError(
+                    "transformers/torch are not installed. "
+                    "Install them with: pip install transformers torch accelerate"
+                ) from e
+
+            self._pipeline = pipeline(
+                "automatic-speech-recognition",
+                model=self.model_name,
+                torch_dtype=torch.float16,
+                device="cuda",
+                model_kwargs={"attn_implementation": "flash_attention_2"},
+            )
+            # reduce-overhead mode captures CUDA graphs under the hood,
+            # removing per-token kernel-launch gaps; harmless to skip on
+            # torch builds where compilation fails
+            try:
+                self._pipeline.model = torch.compile(
+                    self._pipeline.model, mode="reduce-overhead"
+                )
+            except Exception:
+                pass
+        return self._pipeline
+
+    async def transcribe(self, audio: AudioSource) -> str:
+        """Transcribe audio with chunked batched decoding on the GPU."""
+        return await asyncio.get_running_loop().run_in_executor(
+            _WHISPER_EXECUTOR, self._transcribe_sync, audio
+        )
+
+    def _transcribe_sync(self, audio: AudioSource) -> str:
+        """Synchronous transcription."""
+        pipe = self._get_pipeline()
+        # The pipeline takes a path or raw bytes, not file objects
+        source = audio if isinstance(audio, str) else _as_bytes(audio)
+        with self._pipeline_lock:
+            result = pipe(source, chunk_length_s=30, batch_size=24)
+        return (result.get("text") or "").strip()
+
 
 class WhisperAPIService:
     """
@@ -127,7 +400,10 @@ class WhisperAPIService:
     - openai-whisper-asr-webservice (Docker: onerahmet/openai-whisper-asr-webservice)
     - Any OpenAI-compatible /v1/audio/transcriptions endpoint
     """
-    
+
+    # Whisper endpoints accept OGG/Opus uploads directly
+    accepts_ogg = True
+
     def __init__(self, api_url: str):
         """
         Initialize Whisper API service.
@@ -136,82 +412,129 @@ class WhisperAPIService:
             api_url: Base URL of the Whisper API (e.g., http://localhost:9000)
         """
         self.api_url = api_url.rstrip("/")
+        # One long-lived session: keep-alive reuse skips the TCP handshake
+        # on every upload instead of opening a fresh pool per call
+        self._session: aiohttp.ClientSession | None = None
+        # Remembered after the first success so later calls go straight
+        # to the endpoint flavor this server actually speaks
+        self._endpoint: str | None = None
+        # Endpoint URLs never change after construction; build them once
+        self._url_openai = f"{self.api_url}/v1/audio/transcriptions"
+        self._url_asr = f"{self.api_url}/asr"
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=300),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
     
-    async def transcribe(self, audio_path: str) -> str:
+    async def transcribe(self, audio: AudioSource) -> str:
         """
         Transcribe audio using external API.
-        
+
         Args:
-            audio_path: Path to audio file
-        
+            audio: Path to an audio file or a binary stream
+
         Returns:
             Transcribed text
         """
-        # Try OpenAI-compatible endpoint first
-        endpoint = f"{self.api_url}/v1/audio/transcriptions"
-        
-        async with aiohttp.ClientSession() as session:
-            with open(audio_path, "rb") as f:
-                data = aiohttp.FormData()
-                data.add_field(
-                    "file",
-                    f,
-                    filename=Path(audio_path).name,
-                    content_type="audio/ogg",
-                )
-                data.add_field("model", "whisper-1")
-                data.add_field("response_format", "text")
-                
-                async with session.post(endpoint, data=data) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    
-                    # Try alternative endpoint format
-                    pass
-        
+        if isinstance(audio, (str, os.PathLike)):
+            filename = os.path.basename(audio)
+            # Read off the event loop; a blocking open() here would
+            # stall every other handler for the duration of the disk I/O
+            async with aiofiles.open(audio, "rb") as f:
+                payload = await f.read()
+        else:
+            filename = getattr(audio, "name", "voice.ogg")
+            payload = _as_bytes(audio)
+
+        session = self._get_session()
+
+        # Try OpenAI-compatible endpoint first (unless a prior call
+        # already learned this server only speaks /asr)
+        if self._endpoint != "asr":
+            endpoint = self._url_openai
+
+            data = aiohttp.FormData()
+            data.add_field(
+                "file",
+                payload,
+                filename=filename,
+                content_type="audio/ogg",
+            )
+            data.add_field("model", "whisper-1")
+            data.add_field("response_format", "text")
+
+            async with session.post(endpoint, data=data) as response:
+                if response.status == 200:
+                    self._endpoint = "openai"
+                    return await response.text()
+
+                # Try alternative endpoint format
+                pass
+
         # Try simple /asr endpoint (openai-whisper-asr-webservice format)
-        endpoint = f"{self.api_url}/asr"
-        
-        async with aiohttp.ClientSession() as session:
-            with open(audio_path, "rb") as f:
-                data = aiohttp.FormData()
-                data.add_field(
-                    "audio_file",
-                    f,
-                    filename=Path(audio_path).name,
-                )
-                
-                params = {
-                    "task": "transcribe",
-                    "output": "txt",
-                }
-                
-                async with session.post(endpoint, data=data, params=params) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    
-                    error = await response.text()
-                    raise Exception(f"Whisper API error ({response.status}): {error}")
+        endpoint = self._url_asr
+
+        data = aiohttp.FormData()
+        data.add_field(
+            "audio_file",
+            payload,
+            filename=filename,
+        )
+
+        params = {
+            "task": "transcribe",
+            "output": "txt",
+        }
+
+        async with session.post(endpoint, data=data, params=params) as response:
+            if response.status == 200:
+                self._endpoint = "asr"
+                return await response.text()
+
+            error = await response.text()
+            raise Exception(f"Whisper API error ({response.status}): {error}")
 
 
 def create_transcription_service(
     mode: str,
     model: str = "base",
     api_url: str | None = None,
+    compute_type: str | None = None,
+    beam_size: int = 1,
+    language: str | None = None,
 ) -> TranscriptionService:
     """
     Factory function to create a transcription service.
     
     Args:
-        mode: 'local' for faster-whisper, 'api' for external API
+        mode: 'local' for faster-whisper, 'insanely_fast' for the
+            transformers large-v3-turbo pipeline, 'api' for external API
         model: Model size for local mode
         api_url: API URL for api mode
-    
+        compute_type: CTranslate2 compute type override for local mode
+        beam_size: Decode beam width for local mode (1 = greedy)
+        language: Fixed transcription language for local mode
+            (skips per-file language detection); None = auto-detect
+
     Returns:
         TranscriptionService instance
     """
     if mode == "local":
-        return LocalWhisperService(model_size=model)
+        return LocalWhisperService(
+            model_size=model,
+            compute_type=compute_type,
+            beam_size=beam_size,
+            language=language,
+        )
+    elif mode == "insanely_fast":
+        return InsanelyFastWhisperService()
     elif mode == "api":
         if not api_url:
             raise ValueError("api_url is required for API mode")
@@ -220,27 +543,37 @@ def create_transcription_service(
         raise ValueError(f"Unknown transcription mode: {mode}")
 
 
-async def convert_ogg_to_wav(ogg_path: str) -> str:
+def decode_ogg_to_array(audio: AudioSource):
     """
-    Convert OGG audio to WAV format using pydub.
-    
-    Telegram voice messages are in OGG Opus format.
-    
+    Decode OGG/Opus audio to a mono float32 numpy array at 16 kHz.
+
+    Telegram voice messages are in OGG Opus format. Decoding in-process
+    with PyAV avoids the ffmpeg fork/exec and temp WAV file of the old
+    subprocess conversion; Whisper backends accept the ndarray directly.
+
     Args:
-        ogg_path: Path to OGG file
-    
+        audio: Path to an audio file or a binary stream
+
     Returns:
-        Path to converted WAV file
+        np.ndarray of float32 samples (mono, 16 kHz)
     """
-    from pydub import AudioSegment
-    
-    loop = asyncio.get_event_loop()
-    
-    def convert():
-        audio = AudioSegment.from_ogg(ogg_path)
-        wav_path = ogg_path.replace(".ogg", ".wav")
-        audio.export(wav_path, format="wav")
-        return wav_path
-    
-    return await loop.run_in_executor(None, convert)
+    try:
+        import av
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(
+            "PyAV/numpy are required for in-process audio decoding. "
+            "Install them with: pip install av numpy"
+        ) from e
+
+    chunks = []
+    with av.open(_rewind(audio)) as container:
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=16000)
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
 
@@ -0,0 +1,30 @@
+// Token and server URL come from the page's meta tags, so this script
+// stays static and cacheable across users.
+const token = document.querySelector('meta[name="extension-token"]').content;
+const serverUrl = document.querySelector('meta[name="server-url"]').content;
+
+// Notify extension that we're ready to connect
+window.postMessage({
+    type: 'ANYTYPE_EXTENSION_CONNECT',
+    token: token,
+    serverUrl: serverUrl
+}, '*');
+
+// Listen for extension response
+window.addEventListener('message', (event) => {
+    if (event.data.type === 'ANYTYPE_EXTENSION_CONNECTED') {
+        document.getElementById('status').className = 'status success';
+        document.getElementById('status').innerHTML = '✅ Подключено!';
+        document.getElementById('instructions').textContent =
+            'Расширение подключено. Можете закрыть эту страницу и начать запись в Google Meet!';
+    }
+});
+
+// Show manual link after 5 seconds if no response
+setTimeout(() => {
+    if (!document.getElementById('status').classList.contains('success')) {
+        document.getElementById('manual').style.display = 'block';
+        document.getElementById('instructions').innerHTML =
+            'Расширение не обнаружено.<br>Убедитесь что оно установлено и страница открыта в том же браузере.';
+    }
+}, 5000);